@@ -7,14 +7,26 @@ import sys
 import pandas as pd
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QPushButton, 
                              QLineEdit, QVBoxLayout, QHBoxLayout, QWidget,
-                             QScrollArea, QGridLayout, QSizePolicy, QFileDialog)
-from PyQt5.QtGui import (QPixmap, QFont, QScreen, QImage)
+                             QScrollArea, QGridLayout, QSizePolicy, QFileDialog, QComboBox)
+from PyQt5.QtGui import (QPixmap, QFont, QScreen, QImage, QImageReader)
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
 from PIL import Image, ImageDraw, ImageFont
 from utils import *
 import shutil
 
 
+CONFIG_FILTER = "Config Files (*.xlsx *.csv *.parquet *.feather *.ndjson *.jsonl);;All Files (*)"
+SAVE_CONFIG_FILTER = "Excel Files (*.xlsx);;CSV Files (*.csv);;Parquet Files (*.parquet);;Feather Files (*.feather);;NDJSON Files (*.ndjson)"
+OUTPUT_FORMAT = "png-fast"  # 批量生成的输出格式，见 utils.io.OUTPUT_FORMATS
+# 批量生成的输出方式：(显示名, 扩展名, 文件过滤器)，扩展名为 None 时逐张写入文件夹
+OUTPUT_TARGETS = [
+    ("文件夹", None, None),
+    ("ZIP 压缩包", ".zip", "Zip Files (*.zip)"),
+    ("TAR 归档", ".tar", "Tar Files (*.tar)"),
+    ("多页 TIFF", ".tif", "TIFF Files (*.tif)"),
+    ("多页 PDF", ".pdf", "PDF Files (*.pdf)"),
+]
+
 def disable_all_buttons(layout):
     """
     禁用布局中的所有按钮。
@@ -37,11 +49,16 @@ class ImageLabel(QLabel):
     imageChanged = pyqtSignal()
     sizeChanged = pyqtSignal()
     
+    PYRAMID_MIN_SIDE = 256  # 金字塔最小层的长边
+    
     def __init__(self, coord_label, _imgp=None, parent=None):
         super().__init__(parent)
         self.setMouseTracking(True)
+        self.setMinimumSize(1, 1)  # 允许窗口缩小到低于 pixmap 尺寸
         self.coord_label = coord_label
         self._imgp = _imgp
+        self.img = self._load_img()
+        self.pyramid = []
         self.set_attr()
         
         self.imageChanged.connect(self.update_img)
@@ -52,42 +69,80 @@ class ImageLabel(QLabel):
         return self._imgp
     
     def _load_img(self):
-        try:
-            return Image.open(self.imgp)
-        except:
+        """
+        只读取图像头部获取尺寸，不解码像素。
+        """
+        if not self.imgp:
+            return None
+        size = QImageReader(self.imgp).size()
+        if not size.isValid():
             return None
+        return (size.width(), size.height())
+    
+    def _build_pyramid(self):
+        """
+        解码一次模版，并逐级减半生成预缩放的 pixmap 金字塔（由大到小）。
+        """
+        pixmap = QPixmap(self.imgp)
+        if pixmap.isNull():
+            return []
+        pyramid = [pixmap]
+        while max(pixmap.width(), pixmap.height()) // 2 >= self.PYRAMID_MIN_SIDE:
+            pixmap = pixmap.scaled(pixmap.width() // 2, pixmap.height() // 2, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            pyramid.append(pixmap)
+        return pyramid
+    
+    def _pick_level(self, w, h):
+        """
+        选择能覆盖目标尺寸的最小层级，避免每次都从原图缩放。
+        """
+        for pixmap in reversed(self.pyramid):
+            if pixmap.width() >= w or pixmap.height() >= h:
+                return pixmap
+        return self.pyramid[0]
     
     @imgp.setter
     def imgp(self, new_imgp):
         try:
             self._imgp = new_imgp
             self.img = self._load_img()
+            self.pyramid = self._build_pyramid() if self.img else []
+            self._scaled_key = None
             self.imageChanged.emit()
         except:
             self._imgp = None
             self.img = None
+            self.pyramid = []
     
     @pyqtSlot()
     def update_img(self):
-        if self._if_load():
-            self.pixmap = QPixmap(self.imgp)
-            self.scaled_pixmap = self.pixmap.scaled(self.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            self.setPixmap(self.scaled_pixmap)
+        if self._if_load() and self.pyramid:
+            target = self.size()
+            key = (target.width(), target.height())
+            if getattr(self, "_scaled_key", None) != key:
+                level = self._pick_level(*key)
+                self.scaled_pixmap = level.scaled(target, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                self._scaled_key = key
+                self.setPixmap(self.scaled_pixmap)
             self.setAlignment(Qt.AlignCenter)
             self.set_attr()
         else:
             pass
     
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.sizeChanged.emit()
+    
     def set_attr(self):
         if self._if_load():
             self._cal_ratio()
             self._check_case()
         
     def _if_load(self):
-        return True if self.imgp else False
+        return True if self.imgp and self.img else False
     
     def _cal_ratio(self):
-        self.w_gt, self.h_gt = self.img.size
+        self.w_gt, self.h_gt = self.img
         self.r_gt = self.w_gt / self.h_gt  # w_gt / h_gt
         self.w_b, self.h_b = self.width(), self.height()
         self.r_b = self.w_b / self.h_b
@@ -284,7 +339,15 @@ class ImageEditor(QMainWindow):
         preview_layout.addWidget(self.preview_button)
         preview_layout.addWidget(self.back_button)
         right_layout.addLayout(preview_layout)
-        right_layout.addWidget(self.generate_button)
+
+        # =========Output target & Generate button=========
+        generate_layout = QHBoxLayout()
+        self.output_combo = QComboBox(self)
+        for title, _, _ in OUTPUT_TARGETS:
+            self.output_combo.addItem(title)
+        generate_layout.addWidget(self.output_combo)
+        generate_layout.addWidget(self.generate_button)
+        right_layout.addLayout(generate_layout)
 
         main_layout.addLayout(right_layout)
 
@@ -308,10 +371,11 @@ class ImageEditor(QMainWindow):
         default_folder = pjoin(root(), 'configs')
         options = QFileDialog.Options()
         options |= QFileDialog.DontUseNativeDialog  # 可选
-        files, _ = QFileDialog.getOpenFileNames(self, "Select XLSX Files", default_folder, "Excel Files (*.xlsx);;All Files (*)", options=options)
-        if len(files) == 1:
-            file_name = files[0]            
-            df = check_format(file_name)
+        files, _ = QFileDialog.getOpenFileNames(self, "Select Config Files", default_folder, CONFIG_FILTER, options=options)
+        entries = expand_config_files(files)
+        if len(entries) == 1:
+            file_name, source = next(iter(entries.items()))
+            df = check_format(source)
             if not isinstance(df, pd.DataFrame):
                 print(f"导入的文件({file_name})不是有效的文件。")
                 self.label.setText(f"导入的文件({file_name})不是有效的文件。")
@@ -355,8 +419,8 @@ class ImageEditor(QMainWindow):
             
         else:
             tmp_dict = {}
-            for file_name in files:
-                df = check_format(file_name)
+            for file_name, source in entries.items():
+                df = check_format(source)
                 tmp_dict[file_name] = df
                 if not isinstance(df, pd.DataFrame):
                     print(f"导入的文件({file_name})不是有效的文件。")
@@ -373,7 +437,7 @@ class ImageEditor(QMainWindow):
                         widget_to_remove.deleteLater()
             
             # Show new content
-            for row,file in enumerate(files):
+            for row,file in enumerate(entries):
                 value = file
                 edit = QLabel(self)
                 edit.setText(str(value))
@@ -445,14 +509,11 @@ class ImageEditor(QMainWindow):
 
         # Ask the user where to save the file
         default_folder = pjoin(root(), 'configs')
-        file_name, _ = QFileDialog.getSaveFileName(self, "Save File", default_folder, "Excel Files (*.xlsx);;CSV Files (*.csv)")
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save File", default_folder, SAVE_CONFIG_FILTER)
         
         if file_name:
             try:
-                if file_name.endswith('.xlsx'):
-                    df.to_excel(file_name, index=False)
-                elif file_name.endswith('.csv'):
-                    df.to_csv(file_name, index=False)
+                write_config(df, file_name)
                 print("Configuration saved successfully!")
             except Exception as e:
                 print(f"Failed to save configuration: {e}")
@@ -460,10 +521,13 @@ class ImageEditor(QMainWindow):
     def preview_image(self):
         default_path = pjoin(root(), 'tmp', 'preview.png')
         try:
+            profiler.reset()
             flag = draw(self.img, self.conf, default_path)
             if flag:
                 self.preview_imgp = default_path
                 self.image_label.imgp = self.preview_imgp
+                if profiler.enabled:
+                    self.label.setText(profiler.summary())
         except Exception as e:
             print(f"[1] An error occurred: {e}")
     
@@ -523,26 +587,90 @@ class ImageEditor(QMainWindow):
                     except Exception as e:
                         print(f"[2] An error occurred: {e}")
             else:
-                save_root = QFileDialog.getExistingDirectory(self, 'Select Folder', root())
+                _, target_ext, target_filter = OUTPUT_TARGETS[self.output_combo.currentIndex()]
+                sink = None
+                if target_ext is None:
+                    save_root = QFileDialog.getExistingDirectory(self, 'Select Folder', root())
+                else:
+                    # 整批写入单个压缩包或多页文件，日志与清单写在同一目录
+                    sink_p, _ = QFileDialog.getSaveFileName(self, "Save File", pjoin(root(), f"output{target_ext}"), target_filter)
+                    if not sink_p:
+                        return
+                    if not sink_p.lower().endswith(target_ext):
+                        sink_p += target_ext
+                    save_root = os.path.dirname(sink_p)
+                    sink = open_sink(sink_p, fmt=OUTPUT_FORMAT)
                 # save_root = pjoin(root(), 'tmp')
                 if not os.path.exists(save_root):
                     os.makedirs(save_root)
                 logfile = pjoin(save_root, 'log.txt')
-                for ind, (key, df) in enumerate(self.confs.items()):
+                render_cache = RenderCache()
+                # 编码与写盘交给后台线程，与下一张的渲染重叠
+                writer = AsyncWriter(fmt=OUTPUT_FORMAT)
+                ext = output_format(OUTPUT_FORMAT).ext
+                # 逐项记录状态的清单，重新运行时跳过已完成项，只重试失败和变化的项。
+                # 压缩包/多页文件每次都重新写出，无法续跑，清单只记录各项的完成与失败
+                if sink is None:
+                    manifest = BatchManifest(pjoin(save_root, 'batch.json'))
+                else:
+                    manifest = BatchManifest(f"{sink.path}.batch.json", resume=False)
+                template_digest = file_digest(self.img)  # 模版整批只哈希一次
+                skipped = 0
+                # 按模版与字符重合度排序，并在后台预取后续配置需要的字形与字号
+                jobs = schedule_jobs([(key, self.img, df) for key, df in self.confs.items()])
+                prefetcher = Prefetcher([df for _, _, df in jobs])
+                profiler.reset()
+                for ind, (key, _, df) in enumerate(jobs):
+                    prefetcher.advance(ind)
                     try:
-                        write_log(logfile, f"{ind} / {len(self.confs)} 正在生成{key}...")
+                        name = config_stem(key)
+                        seed = document_seed(name)
+                        save_p = pjoin(save_root, f'{name}{ext}') if sink is None else f"{sink.path}::{name}"
+                        job = job_hash(self.img, df, seed, OUTPUT_FORMAT, template_digest=template_digest)
+                        if sink is None and not manifest.should_run(key, job, save_p):
+                            skipped += 1
+                            continue
+                        writer.log(logfile, f"{ind} / {len(self.confs)} 正在生成{key}...")
                         print(f"{ind} / {len(self.confs)} 正在生成{key}...")
                         self.label.setText(f"正在生成{key}...")
-                        name = os.path.splitext(os.path.split(key)[-1])[0]
-                        save_p = pjoin(save_root, f'{name}.png')
-                        flag = draw(self.img, df, save_p)
+                        manifest.start(key, job, save_p)
+                        callback = lambda e, key=key: manifest.finish(key) if e is None else manifest.fail(key, e)
+                        if sink is not None:
+                            image = draw(self.img, df, None, seed=seed, cache=render_cache)
+                            writer.submit(sink.write, name, image, callback=callback)
+                            flag = True
+                        else:
+                            flag = draw(self.img, df, save_p, seed=seed, cache=render_cache, writer=writer,
+                                        callback=callback)
                         if flag:
                             print(f"保存至{save_p}")
                             self.label.setText(f"保存至{save_p}")
                             # self.preview_imgp = save_p
                             # self.image_label.imgp = self.preview_imgp
                     except Exception as e:
-                        print(f"[3] An error occurred: {e}")
+                        manifest.fail(key, e)
+                        writer.log(logfile, f"[3] 生成{key}失败: {e}")
+                        print(f"[3] 生成{key}失败: {e}")
+                prefetcher.close()
+                writer.close()
+                if sink is not None:
+                    sink.close()
+                manifest.close()
+                summary = manifest.summary()
+                message = f"完成 {summary.get('done', 0)} 项，失败 {summary.get('failed', 0)} 项，跳过 {skipped} 项。"
+                if writer.errors:
+                    # 后台写入线程中的失败（磁盘已满、文件被占用等）
+                    names = "，".join(os.path.basename(str(path)) for path, _ in writer.errors[:3])
+                    message += f"写入失败 {len(writer.errors)} 项：{names}{'…' if len(writer.errors) > 3 else ''}"
+                if manifest.errors:
+                    message += f"进度清单写入失败：{manifest.errors[-1]}"
+                print(message)
+                self.label.setText(message)
+                if profiler.enabled:
+                    # 逐页与整批的分阶段耗时
+                    profiler.save(pjoin(save_root, 'profile.json'))
+                    print(profiler.summary())
+                    self.label.setText(profiler.summary())
                 self.confs = {}
         except:
             self.label.setText(f"未检测到任何配置文件。")
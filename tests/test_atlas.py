@@ -0,0 +1,14 @@
+import os
+import numpy as np
+from utils.write import text_to_png
+
+
+FONT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets', 'fonts', '宋体.ttf')
+
+
+def test_atlas_matches_whole_string_rendering():
+    for text, size in (("餐厅负责人", 60), ("粤B12345", 80), ("2024-01-01", 41)):
+        atlas = np.asarray(text_to_png(text, size, FONT, atlas=True))
+        whole = np.asarray(text_to_png(text, size, FONT, atlas=False))
+        assert atlas.shape == whole.shape
+        np.testing.assert_array_equal(atlas, whole)
@@ -0,0 +1,37 @@
+import random
+from PIL import Image
+from utils.cache import VariantPool
+
+
+def _factory(calls):
+    def factory(rng):
+        calls.append(1)
+        return Image.new('RGBA', (rng.randrange(1, 64), 8))
+    return factory
+
+
+def test_variant_pool_hits_across_documents():
+    pool = VariantPool(pool_size=4)
+    calls = []
+    for doc in range(50):
+        rng = random.Random(doc)  # 每张单据独立的随机源
+        for text in ("收油人员", "餐厅负责人", "张三"):
+            pool.get((text, 80), _factory(calls), rng)
+    # 每个键最多合成 pool_size 个变体，其余请求全部命中
+    assert len(calls) <= 3 * pool.pool_size
+    assert len(pool.layers) == len(calls)
+
+
+def test_variant_pool_is_reproducible():
+    calls = []
+    first = VariantPool(pool_size=4).get(("张三", 80), _factory(calls), random.Random(1))
+    second = VariantPool(pool_size=4).get(("张三", 80), _factory(calls), random.Random(1))
+    assert first.size == second.size
+
+
+def test_variant_pool_seed_changes_variants():
+    sizes = set()
+    for seed in range(8):
+        pool = VariantPool(pool_size=1, seed=seed)
+        sizes.add(pool.get(("张三", 80), _factory([]), random.Random(0)).size)
+    assert len(sizes) > 1
@@ -0,0 +1,274 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import struct
+import platform
+import tempfile
+import statistics
+import contextlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from PIL import Image
+from utils import (root, pjoin, draw, use_handswrite, text_to_png, resolve_fallback_fonts,
+                   handwrite_pool, text_layer_cache, get_atlas, profiler)
+from utils.augmentation import Augmentation
+from utils.write import _PLAN_CACHE, load_font
+from utils.glyphs import _load_pyramid
+from utils.fonts import _font_coverage
+from tools_CONFGEN import ConfigGenerator, example_cofig
+from tools_HWDB import iter_gnt_samples, stylize_sample
+
+
+# ================================================================
+template = pjoin(root(), 'assets', 'templates', '合鑫.png')  # 模版
+rows = 20  # 每张配置的行数
+text_length = 6  # 每行文字的字数
+hand_ratio = 0.5  # 手写行所占比例，其余为字体行
+sheets = 8  # 每批的配置(单据)数
+gnt_samples = 200  # 合成 GNT 文件中的样本数
+repeat = 3  # 每项预热后的重复次数
+seed = 0  # 合成数据与渲染的随机种子
+output = "benchmark.json"  # 结果输出路径
+baseline = None  # 设为此前的结果文件时进行对比
+tolerance = 0.10  # 与基线相差超过该比例才视为变快/变慢
+quiet = True  # 屏蔽被测函数的打印
+# ================================================================
+
+
+TTF_CHARS = "餐厅收油单流水号车牌日期桶数负责人有限公司广东深圳市东莞环保科技0123456789"
+
+
+def clear_caches():
+    """
+    清空进程内的所有渲染缓存，使下一次调用等同于新进程的冷启动。
+    """
+    _PLAN_CACHE.clear()
+    handwrite_pool.layers.clear()
+    text_layer_cache.clear()
+    get_atlas.cache_clear()
+    load_font.cache_clear()
+    _load_pyramid.cache_clear()
+    _font_coverage.cache_clear()
+
+
+def hand_names():
+    directory = pjoin(root(), 'assets', 'imgs')
+    # 涂画 是涂改笔迹而非文字
+    return sorted(x for x in os.listdir(directory) if os.path.isdir(pjoin(directory, x)) and x != '涂画')
+
+
+def synth_text(rng, length, hand):
+    """
+    合成一行文字：手写行由字库中的目录名拼接，字体行从常用字中抽取。
+    """
+    if not hand:
+        return "".join(rng.choice(TTF_CHARS) for _ in range(length))
+    names = hand_names()
+    text = ""
+    while len(text) < length:
+        text += rng.choice(names)
+    return text
+
+
+def synth_config(rng, size, rows, text_length, hand_ratio):
+    """
+    在模版范围内合成一张配置，行沿纵向均匀分布。
+
+    Args:
+        rng (random.Random): 随机源。
+        size (tuple): 模版 (宽, 高)。
+        rows (int): 行数。
+        text_length (int): 每行字数。
+        hand_ratio (float): 手写行的比例。
+
+    Returns:
+        pd.DataFrame: 含 文字/X/Y/大小/字体 列的配置。
+    """
+    width, height = size
+    records = []
+    step = (height - 400) // max(rows, 1)
+    for i in range(rows):
+        hand = rng.random() < hand_ratio
+        records.append({"文字": synth_text(rng, text_length, hand),
+                        "X": rng.randint(100, width // 3),
+                        "Y": 100 + i * step,
+                        "大小": rng.randint(50, 90),
+                        "字体": "hand" if hand else "default"})
+    return pd.DataFrame(records, columns=["文字", "X", "Y", "大小", "字体"])
+
+
+def synth_source(rng, sheets, rows):
+    """
+    合成 ConfigGenerator 的源表，列与 example_cofig 对应，每张单据 rows 行。
+    流水号只写在每组的最后一行，与 split_df 向上回填 (bfill) 的源表格式一致。
+    """
+    records = []
+    for s in range(1, sheets + 1):
+        for i in range(rows):
+            records.append({"流水号": s if i == rows - 1 else np.nan,
+                            "车牌号": "粤B%05d" % rng.randint(0, 99999),
+                            "日期": pd.Timestamp(2024, 5, 1 + s % 28),
+                            "收油人员": synth_text(rng, 2, True),
+                            "餐厅名称": synth_text(rng, rng.randint(4, 24), False),
+                            "桶数": rng.randint(1, 5),
+                            "餐厅负责人": synth_text(rng, 2, True)})
+    return pd.DataFrame(records)
+
+
+def synth_gnt(path, rng, samples):
+    """
+    用字库中的手写图片合成一个 GNT 文件（白底灰度），用于测量 HWDB 解析。
+    """
+    directory = pjoin(root(), 'assets', 'imgs')
+    glyphs = []
+    for name in hand_names():
+        if len(name) != 1:
+            continue
+        for file in sorted(os.listdir(pjoin(directory, name))):
+            if file.endswith('.png'):
+                glyphs.append((name, pjoin(directory, name, file)))
+    with open(path, 'wb') as f:
+        for _ in range(samples):
+            name, p = rng.choice(glyphs)
+            image = Image.open(p).convert("RGBA")
+            gray = Image.new("L", image.size, 255)
+            gray.paste(image.convert("L"), (0, 0), image.getchannel("A"))
+            label = name.encode('gbk')
+            data = gray.tobytes()
+            f.write(struct.pack('<I', 10 + len(data)) + label + struct.pack('<HH', *gray.size) + data)
+
+
+def measure(fn, repeat, units=1):
+    """
+    计时：先清空缓存跑一次作为冷启动，再重复 repeat 次作为热启动。
+
+    Returns:
+        dict: cold/min/median/mean 秒数，units 与每单位的中位耗时。
+    """
+    clear_caches()
+    sink = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+        start = time.perf_counter()
+        fn()
+        cold = time.perf_counter() - start
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    median = statistics.median(times) if times else cold
+    return {"cold": cold,
+            "min": min(times) if times else cold,
+            "median": median,
+            "mean": statistics.mean(times) if times else cold,
+            "units": units,
+            "per_unit": median / units if units else median}
+
+
+def run_benchmarks(workdir):
+    rng = random.Random(seed)
+    size = Image.open(template).size
+    confs = [synth_config(rng, size, rows, text_length, hand_ratio) for _ in range(sheets)]
+    hand_texts = [synth_text(rng, text_length, True) for _ in range(rows)]
+    ttf_texts = [synth_text(rng, text_length, False) for _ in range(rows)]
+    font_path = resolve_fallback_fonts(TTF_CHARS)[0]
+    layers = [use_handswrite(text, 80, rng=random.Random(i)) for i, text in enumerate(hand_texts)]
+    source = synth_source(rng, sheets, rows)
+    gnt_path = pjoin(workdir, 'bench.gnt')
+    synth_gnt(gnt_path, rng, gnt_samples)
+
+    def bench_text_to_png():
+        for text in ttf_texts:
+            text_to_png(text, 80, font_path)
+
+    def bench_use_handswrite():
+        r = random.Random(seed)
+        for text in hand_texts:
+            use_handswrite(text, 80, rng=r)
+
+    def bench_augmentation():
+        r = random.Random(seed)
+        for layer in layers:
+            Augmentation(layer, rng=r).run()
+
+    def bench_draw():
+        draw(template, confs[0], pjoin(workdir, 'draw.png'), seed=seed)
+
+    def bench_config_generator():
+        ConfigGenerator(source, example_cofig, seed=seed, output_path=None)
+
+    def bench_hwdb():
+        for _, image, _ in iter_gnt_samples(gnt_path):
+            stylize_sample(image)
+
+    def bench_end_to_end():
+        generator = ConfigGenerator(source, example_cofig, seed=seed, output_path=None, lazy=True)
+        for ind, (name, df) in enumerate(generator.generate()):
+            draw(template, df, pjoin(workdir, f'{name}.png'), seed=seed + ind)
+
+    benches = [("text_to_png", bench_text_to_png, len(ttf_texts)),
+               ("use_handswrite", bench_use_handswrite, len(hand_texts)),
+               ("augmentation", bench_augmentation, len(layers)),
+               ("draw", bench_draw, 1),
+               ("config_generator", bench_config_generator, sheets),
+               ("hwdb_parse", bench_hwdb, gnt_samples),
+               ("end_to_end", bench_end_to_end, sheets)]
+    results = {}
+    for name, fn, units in benches:
+        print(f"正在测试 {name}...")
+        profiler.reset()
+        results[name] = measure(fn, repeat, units)
+        if profiler.enabled:
+            results[name]["stages"] = profiler.report()["batch"]
+        print(f"{name}: 冷启动 {results[name]['cold']:.3f}s, 中位 {results[name]['median']:.3f}s")
+    return results
+
+
+def compare(results, baseline_results, tolerance):
+    """
+    按中位耗时与基线对比。
+
+    Returns:
+        dict: {name: {"ratio": 当前/基线, "status": "faster" | "slower" | "same"}}.
+    """
+    comparison = {}
+    for name, result in results.items():
+        old = baseline_results.get(name)
+        if not old or not old.get("median"):
+            continue
+        ratio = result["median"] / old["median"]
+        status = "slower" if ratio > 1 + tolerance else "faster" if ratio < 1 - tolerance else "same"
+        comparison[name] = {"ratio": ratio, "status": status}
+        print(f"{name}: {old['median']:.3f}s -> {result['median']:.3f}s ({ratio:.2f}x, {status})")
+    return comparison
+
+
+def main():
+    report = {"meta": {"date": datetime.now().isoformat(timespec='seconds'),
+                       "python": sys.version.split()[0],
+                       "platform": platform.platform(),
+                       "cpu_count": os.cpu_count(),
+                       "params": {"template": os.path.basename(template), "rows": rows,
+                                  "text_length": text_length, "hand_ratio": hand_ratio,
+                                  "sheets": sheets, "gnt_samples": gnt_samples,
+                                  "repeat": repeat, "seed": seed}}}
+    with tempfile.TemporaryDirectory() as workdir:
+        report["results"] = run_benchmarks(workdir)
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        if old.get("meta", {}).get("params") != report["meta"]["params"]:
+            print("[Warning] 基线的测试参数与本次不同，对比结果仅供参考。")
+        report["comparison"] = compare(report["results"], old.get("results", {}), tolerance)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存至 {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
 import os
+import json
+import hashlib
+import numpy as np
 import pandas as pd
 import random
 from datetime import datetime
+from utils import document_seed, sparse_disturb, write_config, write_config_batch
 
 
 
@@ -22,20 +26,126 @@ example_cofig = {
 }
 
 class ConfigGenerator():
-    def __init__(self, file_path, conf):
+    def __init__(self, file_path, conf, seed=None, output_path="generated_config", lazy=False, incremental=False, fmt=".xlsx"):
+        """
+        Args:
+            file_path (str | pd.DataFrame): 源表路径，或已读入的源表。
+            conf (dict): 版面配置，格式见 example_cofig。
+            seed (int, optional): 随机种子，同一 seed 生成完全相同的扰动。
+            output_path (str, optional): 配置输出目录，为 None 时只在内存中返回，不写 xlsx。
+            lazy (bool): 为 True 时不在构造时生成，由调用方通过 generate() 逐个获取。
+            incremental (bool): 为 True 时根据 manifest 只重新生成源数据或版面变化过的组，默认全部生成。
+            fmt (str): 输出格式，.xlsx/.csv/.parquet/.feather/.ndjson。
+        """
         self.conf = conf
+        self.seed = seed
+        self.rng = random.Random(seed)  # 同一 seed 生成完全相同的扰动
+        self.np_rng = np.random.default_rng(self.rng.getrandbits(64))  # 整列扰动使用
         self.check_conf_format()
         self.file_path = file_path
-        self.output_path = "generated_config"
-        if not os.path.exists(self.output_path):
+        self.output_path = output_path
+        self.incremental = incremental
+        self.fmt = fmt
+        if self.output_path and not os.path.exists(self.output_path):
             os.makedirs(self.output_path)
         self.index_column = self.conf.get("一次性")[0]['name']
+        self.columns = {}
+        self.configs = {}
+        self.stale = []  # 本次重新生成的组
+        self.skipped = []  # 未变化而跳过的组
+        self.failed = {}  # 生成出错的组 -> 异常
+        if not lazy:
+            for name, df in self.generate():
+                self.configs[name] = df
+
+    def generate(self):
+        """
+        逐个产出 (分隔值, 配置 DataFrame)，调用方可直接使用而无需读回 generated_config/*.xlsx。
+        增量模式下未变化的组不会产出，其名称记录在 self.skipped 中；
+        生成出错的组不会产出，也不中断其余组，错误记录在 self.failed 中。
+        """
         print(f"通过 {self.index_column} 进行分隔配置文件...")
         self.dfs = self.split_df(self.index_column)
+        manifest = self.load_manifest()
+        layout_hash = self.layout_hash()
+        layout_changed = manifest.get("layout") != layout_hash
+        if manifest and layout_changed:
+            print("版面配置已变化，全部重新生成。")
+        groups = {}
+        self.stale, self.skipped, self.failed = [], [], {}
         for ind, df in enumerate(self.dfs):
-            self.format_subexcel(df)
-            # if ind > 10:
-            #     break
+            name = df[self.columns[self.index_column]].iloc[0]
+            group_hash = self.group_hash(df)
+            old_hash = manifest.get("groups", {}).get(str(name))
+            if not layout_changed and old_hash == group_hash and os.path.exists(self.output_file(name)):
+                groups[str(name)] = group_hash
+                self.skipped.append(name)
+                continue
+            self.seed_group(name)
+            try:
+                item = self.format_subexcel(df)
+            except Exception as e:
+                self.failed[name] = e
+                print(f"[Warning] 生成 {name} 的配置失败，已跳过: {e}")
+                continue
+            self.stale.append(name)
+            # 写出成功后才记录哈希，写入失败（如文件被 Excel 占用）的组下次仍会重新生成
+            groups[str(name)] = group_hash
+            yield item
+        if self.output_path:
+            self.save_manifest({"layout": layout_hash, "groups": groups})
+        line = f"共 {len(self.dfs)} 组，重新生成 {len(self.stale)} 组，跳过 {len(self.skipped)} 组"
+        print(line + (f"，失败 {len(self.failed)} 组。" if self.failed else "。"))
+
+    def output_file(self, name):
+        return os.path.join(self.output_path, f"{name}{self.fmt}") if self.output_path else None
+
+    def save_batch(self, path):
+        """
+        将本次生成的全部配置写入单个批量文件（.parquet/.feather/.ndjson）。
+        """
+        write_config_batch(self.configs, path)
+
+    @property
+    def stale_outputs(self):
+        """
+        本次重新生成、需要重新渲染的配置文件路径。
+        """
+        return [self.output_file(name) for name in self.stale]
+
+    def seed_group(self, name):
+        # 每组的扰动只由 (seed, 分隔值) 决定，跳过其他组时结果与全量生成一致
+        if self.seed is not None:
+            self.rng = random.Random(document_seed(str(name), base=self.seed))
+            self.np_rng = np.random.default_rng(self.rng.getrandbits(64))
+
+    def layout_hash(self):
+        payload = json.dumps([self.conf, self.seed], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def group_hash(self, df):
+        h = hashlib.sha256(json.dumps([str(x) for x in df.columns], ensure_ascii=False).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        return h.hexdigest()
+
+    def manifest_path(self):
+        return os.path.join(self.output_path, "manifest.json")
+
+    def load_manifest(self):
+        if not (self.incremental and self.output_path and os.path.exists(self.manifest_path())):
+            return {}
+        try:
+            with open(self.manifest_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            print("manifest 无法读取，全部重新生成。")
+            return {}
+
+    def save_manifest(self, manifest):
+        tmp = self.manifest_path() + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path())
 
 
     def _validate(self, obj, addkey=None):
@@ -64,38 +174,37 @@ class ConfigGenerator():
         return tardf.columns[find_first_true_index(lst)]
     
     def sparse_disturb(self, x):
-        if isinstance(x, int):  # "扰动": 10
-            return x, x, x
-        else:  # "扰动": 10 20 5
-            return [int(y) for y in x.split(" ")]
+        return sparse_disturb(x)
             
         
+    def resolve_columns(self, data):
+        """
+        对源表结构一次性解析所有配置项对应的列名，后续逐行处理时直接查表。
+        """
+        names = [self.index_column]
+        names += [x["name"] for x in self.conf["一次性"]]
+        names += [x["name"] for x in self.conf.get("纵向", [])]
+        return {name: self.fuzzy_search(data, name) for name in names}
+
     def split_df(self, key_column):
-        data = pd.read_excel(self.file_path)
-        key_column = self.fuzzy_search(data, key_column)
+        if isinstance(self.file_path, pd.DataFrame):
+            data = self.file_path.copy()
+        else:
+            data = pd.read_excel(self.file_path)
+        self.columns = self.resolve_columns(data)
+        key_column = self.columns[key_column]
         try:
-            data[key_column] = data[key_column].fillna(method='bfill')  # 注意观察流水号
+            data[key_column] = data[key_column].bfill()  # 注意观察流水号
             print(f"将 {key_column} 中的值转为整型。")
             data[key_column] = data[key_column].astype('int')
         except:
             print(f"{key_column} 无需填充。")
 
-        # Step 2: Get unique serial numbers after filling
-        unique_serial_numbers = data[key_column].unique()
-
-        # Step 3: Split the data into separate DataFrames for each unique key_column
-        df_dict = {
-            serial_number: data[data[key_column] == serial_number]
-            for serial_number in unique_serial_numbers if not pd.isna(serial_number)
-        }
-        
-        dfs = []
-        for serial_number, df in df_dict.items():
-            dfs.append(df)
-        return dfs
+        # 单次 groupby 完成分隔，按首次出现的顺序返回，空值自动丢弃
+        return [df for _, df in data.groupby(key_column, sort=False)]
     
     def apply_disturbance(self, value, disturbance):
-        return value + random.uniform(-disturbance, disturbance)
+        return value + self.rng.uniform(-disturbance, disturbance)
     
     def check_conf_format(self):
         if not "一次性" in self.conf:
@@ -115,19 +224,50 @@ class ConfigGenerator():
             self.conf["系统设置"] = {"扰动": 5, "字体": "hand"}
             
     
+    def disturb_array(self, value, disturbance, n):
+        """
+        一次性为 n 行生成扰动后的值，等价于逐行调用 apply_disturbance。
+        """
+        return value + self.np_rng.uniform(-disturbance, disturbance, n)
+
+    def truncate_texts(self, values):
+        """
+        截断超过 17 个字符的文字：有 '(' 时截到 '(' 之前，否则保留前 17 个字符。
+        """
+        texts = values.to_numpy(dtype=object)
+        lengths = values.astype(str).str.len().to_numpy()
+        for ind in np.flatnonzero(lengths > 17):  # 过长的行很少，只对这些行逐个处理
+            tar_name_old = texts[ind]
+            tar_name = str(tar_name_old)
+            if tar_name.find('(') != -1:
+                tar_name = tar_name[:tar_name.find('(')]
+            else:
+                tar_name = tar_name[:17]
+            texts[ind] = tar_name
+            print(f"{tar_name_old} 过长，将进行截断，截断为{tar_name}。")
+        return texts
+
     def format_subexcel(self, df):
-        tar_df_name = df[self.fuzzy_search(df, self.index_column)].iloc[0]
+        tar_df_name = df[self.columns[self.index_column]].iloc[0]
         print(f"正在处理 {self.index_column} 为 {tar_df_name} 的表...")
-        output_data = []
+        output_columns = {key: [] for key in ["文字", "X", "Y", "大小", "字体"]}
+
+        def add_rows(texts, xs, ys, sizes, font):
+            output_columns["文字"].append(np.asarray(texts, dtype=object))
+            output_columns["X"].append(np.asarray(xs, dtype=float))
+            output_columns["Y"].append(np.asarray(ys, dtype=float))
+            output_columns["大小"].append(np.asarray(sizes, dtype=int))
+            output_columns["字体"].append(np.full(len(output_columns["文字"][-1]), font, dtype=object))
+
         for item in self.conf["一次性"]:
             if item["name"] == '日期':
-                value = str(df[self.fuzzy_search(df, item["name"])].iloc[0])
+                value = str(df[self.columns[item["name"]]].iloc[0])
                 date_obj = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
                 value_ = str(date_obj.strftime("%Y %m %d"))
                 print(f"特殊处理日期格式，将 {value} 转换为 {value_}。")
                 value = value_
             else:
-                value = str(df[self.fuzzy_search(df, item["name"])].iloc[0])  # 一次性值全部取第一个
+                value = str(df[self.columns[item["name"]]].iloc[0])  # 一次性值全部取第一个
             x, y, size = item["position"]
             if "扰动" in item:
                 x_dis, y_dis, f_dis = self.sparse_disturb(item["扰动"])
@@ -137,7 +277,7 @@ class ConfigGenerator():
             y = self.apply_disturbance(y, y_dis)
             size_dis = int(self.apply_disturbance(size, f_dis))
             font = item['字体'] if '字体' in item else self.conf["系统设置"]["字体"]
-            output_data.append({"文字": value, "X": x, "Y": y, "大小": size_dis, "字体": font})
+            add_rows([value], [x], [y], [size_dis], font)
         
         # 提前找到跟随编号选项
         follow_name = None
@@ -149,62 +289,50 @@ class ConfigGenerator():
         if "纵向" in self.conf:
             for _, conf in enumerate(self.conf["纵向"]):
                 interval = conf["间隔"]
-                name = self.fuzzy_search(df, conf["name"])
+                name = self.columns[conf["name"]]
+                n = len(df[name])
                 if conf["name"] == follow_name:  # 如果有编号，确定跟随项长度
-                    index_length = len(df[name])
+                    index_length = n
                     print(f"找到编号跟随项：{follow_name}, 共计跟随{index_length}项。")
                 x, y, size = conf["position"]
                 font = conf['字体'] if '字体' in conf else self.conf["系统设置"]["字体"]
-                for ind, tar_name in enumerate(df[name]):
-                    if "扰动" in conf:
-                        x_dis, y_dis, f_dis = self.sparse_disturb(conf["扰动"])
-                    else:
-                        x_dis, y_dis, f_dis = self.sparse_disturb(self.conf["系统设置"]["扰动"])
-                    size_dis = int(self.apply_disturbance(size, f_dis))
-                    disturbed_x = self.apply_disturbance(x, x_dis)
+                if "扰动" in conf:
+                    x_dis, y_dis, f_dis = self.sparse_disturb(conf["扰动"])
+                else:
+                    x_dis, y_dis, f_dis = self.sparse_disturb(self.conf["系统设置"]["扰动"])
+                # 整列一次生成位置、间隔偏移与扰动
+                sizes = self.disturb_array(size, f_dis, n).astype(int)
+                xs = self.disturb_array(x, x_dis, n)
+                ys = self.disturb_array(y + np.arange(n) * interval, y_dis, n)
+                if name == "餐厅负责人":
                     # 双重随机性添加(X)(仅针对餐厅负责人)
-                    if name == "餐厅负责人":
-                        tmp = random.uniform(0, 1)
-                        if tmp > 0.9:
-                            disturbed_x = disturbed_x + 120
-                        elif tmp < 0.1:
-                            disturbed_x = disturbed_x - 120
-                    disturbed_y = self.apply_disturbance(y + ind * interval, y_dis)
+                    tmp = self.np_rng.uniform(0, 1, n)
+                    xs = xs + np.where(tmp > 0.9, 120, 0) - np.where(tmp < 0.1, 120, 0)
                     # 双重随机性添加(Y)(仅针对餐厅负责人)
-                    if name == "餐厅负责人":
-                        tmp = random.uniform(0, 1)
-                        if tmp > 0.9:
-                            disturbed_y = disturbed_y + 20
-                        elif tmp < 0.1:
-                            disturbed_y = disturbed_y + 20
-                    # 截断文字
-                    if len(str(tar_name)) > 17:
-                        tar_name_old = tar_name
-                        if tar_name.find('(') != -1:
-                            tar_name = tar_name[:tar_name.find('(')]
-                        else:
-                            tar_name = tar_name[:17]
-                        print(f"{tar_name_old} 过长，将进行截断，截断为{tar_name}。")
-                    output_data.append({"文字": tar_name, "X": disturbed_x, "Y": disturbed_y, "大小": size_dis, "字体": font})
+                    tmp = self.np_rng.uniform(0, 1, n)
+                    ys = ys + np.where((tmp > 0.9) | (tmp < 0.1), 20, 0)
+                # 截断文字
+                add_rows(self.truncate_texts(df[name]), xs, ys, sizes, font)
         
         if "编号" in self.conf:
             interval = ind_conf["间隔"]
             start = ind_conf.get("起始值", 0)
             x, y, size = ind_conf["position"]
             font = ind_conf['字体'] if '字体' in ind_conf else self.conf["系统设置"]["字体"]
-            k = 0
-            for i in range(start, index_length):
-                output_data.append({"文字": str(i), "X": int(x), "Y": int(y + k * interval), "大小": size, "字体": font})
-                k += 1
+            numbers = np.arange(start, index_length)
+            k = np.arange(len(numbers))
+            add_rows(numbers.astype(str), np.full(len(numbers), int(x)), (y + k * interval).astype(int),
+                     np.full(len(numbers), size), font)
             print("已添加编号。")
             
         # Create a DataFrame for the output
-        output_df = pd.DataFrame(output_data)
+        output_df = pd.DataFrame({key: np.concatenate(value) for key, value in output_columns.items()})
 
         # Save the output to an Excel file
-        output_file_path = os.path.join(self.output_path, f"{tar_df_name}.xlsx")
-        output_df.to_excel(output_file_path, index=False)
-        
+        if self.output_path:
+            write_config(output_df, self.output_file(tar_df_name))
+        return tar_df_name, output_df
+
     
     
     
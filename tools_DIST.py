@@ -0,0 +1,319 @@
+import os
+import sys
+import glob
+import json
+import time
+import socket
+import threading
+import subprocess
+from utils import (root, pjoin, draw, document_seed, read_config, write_config, expand_config_files,
+                   check_format, config_stem, output_format, schedule_jobs, atomic_output, BATCH_SEP)
+
+
+# ================================================================
+config_root = pjoin(root(), 'configs')  # 待生成的配置目录
+template_root = pjoin(root(), 'assets', 'templates')  # 与配置同名的模版优先，如 合鑫.xlsx -> 合鑫.png
+default_template = pjoin(root(), 'assets', 'templates', '餐厨废油签收单无标记.png')  # 无同名模版时使用
+work_dir = pjoin(root(), 'tmp', 'dist')  # 共享工作目录，各节点需挂载到同一位置
+local_workers = 4  # local 模式下在本机启动的工作进程数
+fmt = "png-fast"  # 输出格式，见 utils.io.OUTPUT_FORMATS
+seed = 0  # 每张单据的种子由此派生，重试与重新认领时结果一致
+heartbeat_interval = 5.0  # 心跳间隔(秒)
+stale_timeout = 60.0  # 认领超过该时间没有心跳即视为失效，可被其他节点重新认领
+max_attempts = 3  # 单个任务最多尝试次数
+poll_interval = 1.0  # 没有可认领任务时的等待时间(秒)
+# ================================================================
+
+
+# 工作目录结构：
+#   configs/<id>.ndjson          任务的配置（批量文件中的配置也单独写出）
+#   pending/<id>.json            待认领的任务
+#   claimed/<id>.json.<worker>   已认领，文件名带认领者
+#   claimed/<id>.finishing.<worker>  认领者正在写出结果（改名成功即确认仍持有该任务）
+#   done/<id>.json               完成记录
+#   failed/<id>.json             多次失败后的记录
+#   heartbeats/<worker>.json     各节点的最新状态
+#   outputs/<name><ext>          生成结果
+STATES = ["configs", "pending", "claimed", "done", "failed", "heartbeats", "outputs"]
+
+
+def _write_json(path, data):
+    # 先写临时文件再重命名，其他节点不会读到写了一半的文件；临时文件名带线程号，心跳线程与主线程互不干扰
+    with atomic_output(path) as tmp:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def template_for(key):
+    """
+    The template with the same stem as the config file, or default_template.
+    """
+    stem = os.path.splitext(os.path.basename(key.split(BATCH_SEP)[0]))[0]
+    for path in sorted(glob.glob(pjoin(template_root, f"{stem}.*"))):
+        return path
+    return default_template
+
+
+def split_batch(files, work_dir, seed=0, fmt=None):
+    """
+    Coordinator: turn config files into job files under work_dir/pending.
+
+    Jobs are numbered in schedule_jobs order (grouped by template, then by glyph overlap), and
+    workers claim them in name order, so nodes working side by side stay on the same template.
+    The work directory must be empty, jobs of an earlier batch would otherwise be mixed in.
+
+    Args:
+        files (list of str): Config files, batch files are expanded into one job per config.
+        work_dir (str): Shared work directory.
+        seed (int): Batch seed, per-document seeds are derived from the config name.
+        fmt (str, optional): Output format.
+
+    Returns:
+        int: Number of jobs written.
+    """
+    for state in STATES:
+        directory = pjoin(work_dir, state)
+        if os.path.isdir(directory) and os.listdir(directory):
+            raise FileExistsError(f"Work directory is not empty, remove it or use another one: {directory}")
+    for state in STATES:
+        os.makedirs(pjoin(work_dir, state), exist_ok=True)
+    jobs = []
+    for key, source in expand_config_files(files).items():
+        df = check_format(source)
+        if df is None:
+            print(f"[Coordinator] 跳过无效的配置 {key}。")
+            continue
+        jobs.append((key, template_for(key), df))
+    ext = output_format(fmt).ext
+    for ind, (key, template, df) in enumerate(schedule_jobs(jobs)):
+        job_id = f"{ind:06d}"
+        name = config_stem(key)
+        config_p = pjoin(work_dir, "configs", f"{job_id}.ndjson")
+        write_config(df, config_p)
+        _write_json(pjoin(work_dir, "pending", f"{job_id}.json"), {
+            "id": job_id, "key": key, "config": config_p, "template": template,
+            "output": pjoin(work_dir, "outputs", f"{name}{ext}"),
+            "seed": document_seed(name, base=seed), "fmt": fmt, "attempts": 0, "errors": []})
+    print(f"[Coordinator] 已写出 {len(jobs)} 个任务至 {work_dir}。")
+    return len(jobs)
+
+
+def status(work_dir):
+    """
+    Returns:
+        dict: Number of jobs per state, and the last heartbeat of every worker.
+    """
+    counts = {state: len(os.listdir(pjoin(work_dir, state))) for state in ["pending", "claimed", "done", "failed"]}
+    workers = {}
+    for p in glob.glob(pjoin(work_dir, "heartbeats", "*.json")):
+        try:
+            workers[os.path.splitext(os.path.basename(p))[0]] = _read_json(p)
+        except (OSError, ValueError):
+            pass
+    counts["workers"] = workers
+    return counts
+
+
+def _heartbeat_token(work_dir, worker_id):
+    try:
+        return _read_json(pjoin(work_dir, "heartbeats", f"{worker_id}.json")).get("time")
+    except (OSError, ValueError):
+        return None
+
+
+def reclaim_stale(work_dir, stale_timeout, seen):
+    """
+    Move claims whose worker has not written a heartbeat for stale_timeout back to pending.
+
+    Staleness is judged on this node's monotonic clock: a claim is stale once the content of
+    heartbeats/<worker>.json has not changed for stale_timeout since this node first saw it. Clock
+    skew between hosts and file mtimes on the shared directory play no part, and a claim seen for
+    the first time always gets the full timeout.
+
+    Args:
+        work_dir (str): Shared work directory.
+        stale_timeout (float): Seconds without a new heartbeat before a claim is reclaimed.
+        seen (dict): Observation state kept by the caller between calls, {claim name: (heartbeat, since)}.
+
+    Returns:
+        int: Number of reclaimed jobs.
+    """
+    count = 0
+    now = time.monotonic()
+    names = set(os.listdir(pjoin(work_dir, "claimed")))
+    for name in list(seen):
+        if name not in names:
+            del seen[name]
+    for name in sorted(names):
+        parts = name.split(".", 2)
+        if len(parts) != 3 or parts[1] != "json":
+            continue  # <id>.finishing.<worker> 正在写出结果，不回收
+        job_id, _, worker_id = parts
+        token = _heartbeat_token(work_dir, worker_id)
+        last = seen.get(name)
+        if last is None or last[0] != token:
+            seen[name] = (token, now)
+            continue
+        if now - last[1] < stale_timeout:
+            continue
+        try:
+            os.rename(pjoin(work_dir, "claimed", name), pjoin(work_dir, "pending", f"{job_id}.json"))  # 多个节点同时回收时只有一个成功
+        except OSError:
+            continue
+        del seen[name]
+        print(f"[Worker] 回收失效的任务 {job_id}（{worker_id}）。")
+        count += 1
+    return count
+
+
+class Worker(object):
+    """
+    Claims jobs from a shared work directory and renders them with draw.
+
+    A job is claimed by renaming pending/<id>.json to claimed/<id>.json.<worker>, which is atomic,
+    so exactly one node gets it. A heartbeat thread keeps rewriting heartbeats/<worker>.json; claims
+    whose worker has not beaten for stale_timeout are returned to pending by any worker (see
+    reclaim_stale). Outputs are written atomically, so a reclaimed job just renders again with the
+    same seed. Before recording the result the worker renames its claim to a private name, which
+    fails if the job was reclaimed meanwhile; the result is then dropped, so a job is never queued
+    twice.
+    """
+    def __init__(self, work_dir, worker_id=None, heartbeat_interval=5.0, stale_timeout=60.0,
+                 max_attempts=3, poll_interval=1.0):
+        self.work_dir = work_dir
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_timeout = stale_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.job = None
+        self.completed = 0
+        self.failed = 0
+        self._seen = {}
+        self._stop = threading.Event()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.beat()
+            except Exception as e:
+                # 偶发的网络文件系统错误不能让心跳停止，否则本节点的认领会被其他节点回收
+                print(f"[Worker] 写入心跳失败: {e}")
+
+    def beat(self):
+        _write_json(pjoin(self.work_dir, "heartbeats", f"{self.worker_id}.json"), {
+            "worker": self.worker_id, "host": socket.gethostname(), "pid": os.getpid(), "time": time.time(),
+            "job": self.job, "completed": self.completed, "failed": self.failed})
+
+    def claim_next(self):
+        """
+        Returns:
+            tuple: (claim path, job dict), or None when nothing is pending.
+        """
+        for name in sorted(os.listdir(pjoin(self.work_dir, "pending"))):
+            if not name.endswith(".json"):
+                continue
+            pending = pjoin(self.work_dir, "pending", name)
+            claim = pjoin(self.work_dir, "claimed", f"{name}.{self.worker_id}")
+            try:
+                os.rename(pending, claim)
+                return claim, _read_json(claim)
+            except FileNotFoundError:
+                continue  # 被其他节点抢先认领，或刚认领就被回收
+        return None
+
+    def run_job(self, claim, job):
+        self.job = job["id"]
+        self.beat()
+        start = time.time()
+        error = None
+        try:
+            df = read_config(job["config"])
+            draw(job["template"], df, job["output"], seed=job["seed"], fmt=job["fmt"])
+        except Exception as e:
+            error = e
+            print(f"[Worker] 任务 {job['id']} ({job['key']}) 失败: {e}")
+        finally:
+            self.job = None
+        # 先把认领改成私有名称，确认任务仍归本节点；改名失败说明已被回收（可能已被其他节点重新认领）
+        finishing = pjoin(self.work_dir, "claimed", f"{job['id']}.finishing.{self.worker_id}")
+        try:
+            os.rename(claim, finishing)
+        except FileNotFoundError:
+            print(f"[Worker] 任务 {job['id']} 已被回收，不再记录本次结果。")
+            return
+        if error is not None:
+            job["attempts"] += 1
+            job["errors"].append({"worker": self.worker_id, "error": f"{type(error).__name__}: {error}"})
+            state = "failed" if job["attempts"] >= self.max_attempts else "pending"
+            _write_json(pjoin(self.work_dir, state, f"{job['id']}.json"), job)
+            self.failed += 1
+        else:
+            job.update(worker=self.worker_id, duration=time.time() - start, finished=time.time())
+            _write_json(pjoin(self.work_dir, "done", f"{job['id']}.json"), job)
+            print(f"[Worker] 保存至{job['output']}")
+            self.completed += 1
+        os.remove(finishing)
+
+    def run(self, exit_when_idle=True):
+        """
+        Claim and render jobs until nothing is pending or claimed (or forever if exit_when_idle
+        is False).
+        """
+        thread = threading.Thread(target=self._heartbeat, daemon=True)
+        thread.start()
+        try:
+            while True:
+                reclaim_stale(self.work_dir, self.stale_timeout, self._seen)
+                claimed = self.claim_next()
+                if claimed is not None:
+                    self.run_job(*claimed)
+                    continue
+                if exit_when_idle and not os.listdir(pjoin(self.work_dir, "claimed")):
+                    break
+                time.sleep(self.poll_interval)
+        finally:
+            self._stop.set()
+            thread.join()
+            self.beat()
+        print(f"[Worker] {self.worker_id} 结束：完成 {self.completed} 个，失败 {self.failed} 个。")
+
+
+def run_local(files, work_dir, n):
+    """
+    Split a batch and render it with n worker processes on this machine, standing in for nodes.
+    """
+    split_batch(files, work_dir, seed=seed, fmt=fmt)
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", work_dir, f"local-{i}"])
+             for i in range(n)]
+    for p in procs:
+        p.wait()
+    result = status(work_dir)
+    print(f"[Coordinator] 完成 {result['done']} 个，失败 {result['failed']} 个。")
+    return result
+
+
+if __name__ == "__main__":
+    # python tools_DIST.py coordinator [work_dir]      拆分 config_root 下的配置
+    # python tools_DIST.py worker [work_dir] [名称]     在任意节点上启动工作进程
+    # python tools_DIST.py status [work_dir]
+    # python tools_DIST.py local [work_dir]            本机拆分并启动 local_workers 个工作进程
+    mode = sys.argv[1] if len(sys.argv) > 1 else "local"
+    work_dir = sys.argv[2] if len(sys.argv) > 2 else work_dir
+    files = sorted(glob.glob(pjoin(config_root, "*")))
+    if mode == "coordinator":
+        split_batch(files, work_dir, seed=seed, fmt=fmt)
+    elif mode == "worker":
+        Worker(work_dir, sys.argv[3] if len(sys.argv) > 3 else None, heartbeat_interval=heartbeat_interval,
+               stale_timeout=stale_timeout, max_attempts=max_attempts, poll_interval=poll_interval).run()
+    elif mode == "status":
+        print(json.dumps(status(work_dir), ensure_ascii=False, indent=2))
+    elif mode == "local":
+        run_local(files, work_dir, local_workers)
+    else:
+        print(f"未知模式 {mode}，可选 coordinator / worker / status / local。")
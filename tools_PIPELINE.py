@@ -0,0 +1,132 @@
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from utils import (root, pjoin, draw, document_seed, compile_plan, output_format,
+                   SharedImageStore, attach_shared_store)
+from tools_CONFGEN import ConfigGenerator, example_cofig
+
+
+# ================================================================
+source = "收油单信息\\合鑫.xlsx"  # 源表
+template = pjoin(root(), 'assets', 'templates', '合鑫.png')  # 模版
+save_root = "generated_image"  # 输出目录
+audit_path = None  # 设为目录时同时写出中间配置 xlsx，仅用于审计
+workers = os.cpu_count() or 1  # 渲染进程数
+queue_size = 2 * workers  # 生成与渲染之间的队列长度
+seed = None  # 设为整数时整批可复现
+fmt = "png-fast"  # 输出格式，见 utils.io.OUTPUT_FORMATS
+tile_height = None  # 设为行数(如 512)时分条带渲染，单进程内存不再随整页增长
+share_memory = True  # 模版与字库放入共享内存，各渲染进程零拷贝读取
+# ================================================================
+
+
+_DONE = object()
+
+
+def _render_job(template, name, plan, save_p, seed, fmt=None, tile_height=None):
+    draw(template, plan, save_p, seed=seed, fmt=fmt, tile_height=tile_height)
+    return name, save_p
+
+
+def _produce(generator, q):
+    try:
+        for item in generator.generate():
+            q.put(item)
+    except Exception as e:
+        q.put(e)
+    finally:
+        q.put(_DONE)
+
+
+def _collect(done, pending, results):
+    for future in done:
+        name = pending.pop(future)
+        try:
+            results[name] = future.result()[1]
+            print(f"保存至{results[name]}")
+        except Exception as e:
+            results[name] = e
+            print(f"[Pipeline] 渲染 {name} 失败: {e}")
+
+
+def run_pipeline(source, conf, template, save_root, audit_path=None, workers=None, queue_size=None, seed=None, fmt=None,
+                 tile_height=None, share_memory=True):
+    """
+    Generate configs from a source sheet and render them in one pass.
+
+    A producer thread streams (serial, config) groups from ConfigGenerator into a bounded queue,
+    and the main thread feeds them to a process pool, so generation overlaps rendering and no
+    intermediate Excel file is encoded or decoded.
+
+    Args:
+        source (str | pd.DataFrame): Source sheet, see ConfigGenerator.
+        conf (dict): Layout config, see example_cofig.
+        template (str): Template image path.
+        save_root (str): Output directory for rendered pages.
+        audit_path (str, optional): If set, intermediate configs are also written there as xlsx.
+        workers (int, optional): Number of render processes, defaults to the CPU count.
+        queue_size (int, optional): Capacity of the generation queue, defaults to 2 * workers.
+        seed (int, optional): Batch seed, per-document seeds are derived from it.
+        fmt (str, optional): Output format, see utils.io.OUTPUT_FORMATS, defaults to PNG.
+        tile_height (int, optional): Render in strips of this height, see utils.tiles.render_tiled.
+        share_memory (bool): Decode the template and glyphs once into shared memory for all workers.
+
+    Returns:
+        dict: {serial: output path or the exception raised while generating, compiling or rendering it}.
+    """
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or 2 * workers
+    if not os.path.exists(save_root):
+        os.makedirs(save_root)
+
+    # 审计目录只用于留存配置，跳过未变化的组会导致这些组不被渲染，因此关闭增量生成
+    generator = ConfigGenerator(source, conf, seed=seed, output_path=audit_path, lazy=True, incremental=False)
+    q = queue.Queue(maxsize=queue_size)
+    producer = threading.Thread(target=_produce, args=(generator, q), daemon=True)
+    producer.start()
+
+    results = {}
+    pending = {}
+    # 模版与字库只在主进程解码一次，渲染进程挂载同一块共享内存
+    store = SharedImageStore.create(templates=[template]) if share_memory else None
+    initializer, initargs = (attach_shared_store, (store.handle,)) if store else (None, ())
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+            while True:
+                item = q.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                name, df = item
+                doc_seed = None if seed is None else document_seed(str(name), base=seed)
+                save_p = pjoin(save_root, f"{name}{output_format(fmt).ext}")
+                # 在主进程中编译一次，工作进程只接收体积很小的渲染计划
+                try:
+                    plan = compile_plan(df)
+                except Exception as e:
+                    # 与渲染失败一样按单据记录，不中断其余组
+                    results[name] = e
+                    print(f"[Pipeline] 编译 {name} 失败: {e}")
+                    continue
+                pending[pool.submit(_render_job, template, name, plan, save_p, doc_seed, fmt, tile_height)] = name
+                # 在途任务不超过进程数，生成端由有界队列反压
+                if len(pending) >= workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    _collect(done, pending, results)
+            _collect(wait(pending).done, pending, results)
+    finally:
+        if store is not None:
+            store.close()
+            store.unlink()
+    producer.join()
+    for name, e in generator.failed.items():
+        results[name] = e
+    return results
+
+
+if __name__ == "__main__":
+    run_pipeline(source, example_cofig, template, save_root, audit_path=audit_path,
+                 workers=workers, queue_size=queue_size, seed=seed, fmt=fmt, tile_height=tile_height,
+                 share_memory=share_memory)
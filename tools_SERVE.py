@@ -0,0 +1,316 @@
+import io
+import os
+import json
+import time
+import random
+import asyncio
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+from PIL import Image
+from utils import (root, pjoin, compile_plan, render_plan, load_template, save_image, output_format,
+                   preload_glyphs, font_coverage, SharedImageStore, attach_shared_store)
+
+
+# ================================================================
+host = "127.0.0.1"  # 只监听本机
+port = 8765
+workers = os.cpu_count() or 1  # 渲染进程数
+batch_size = 8  # 每批最多合并的请求数
+batch_window = 0.01  # 凑批等待的最长时间(秒)
+max_queue = 256  # 排队请求超过该数量时返回 503
+preload_templates = ["合鑫.png"]  # 启动时解码并放入共享内存的模版
+fmt = "png-fast"  # 默认输出格式，见 utils.io.OUTPUT_FORMATS
+# ================================================================
+
+
+# 请求体示例：
+# POST /render
+# {"template": "合鑫.png", "seed": 1, "format": "png-fast",
+#  "rows": [{"文字": "张三", "X": 100, "Y": 200, "大小": 80, "字体": "hand"}]}
+# 返回渲染后的图片字节；GET /metrics 返回队列深度与延迟统计。
+
+CONTENT_TYPES = {'PNG': 'image/png', 'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+MAX_BODY = 16 * 1024 * 1024
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _warm_worker(handle):
+    """
+    Worker initializer: attach the shared templates/glyphs and build the glyph and font indexes.
+    """
+    if handle is not None:
+        attach_shared_store(handle)
+    preload_glyphs()
+    font_coverage()
+
+
+def _render_batch(jobs):
+    """
+    Render a batch of (template, plan, seed, fmt) jobs in one worker call.
+
+    Returns:
+        list: Encoded bytes, or (HTTP status, error message), per job.
+    """
+    results = []
+    for template, plan, seed, job_fmt in jobs:
+        try:
+            rng = random.Random(seed)
+            image = render_plan(load_template(template), plan, rng=rng)
+            buffer = io.BytesIO()
+            save_image(image, buffer, job_fmt)
+            results.append(buffer.getvalue())
+        except ValueError as e:
+            # render_plan 只在文字超出模版范围时抛出 ValueError，属于请求错误
+            results.append((400, f"{type(e).__name__}: {e}"))
+        except Exception as e:
+            results.append((500, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _compile_request(df, template):
+    """
+    Compile a request's rows and read the template size, on the service's compile thread.
+
+    Returns:
+        tuple: (RenderPlan, (template width, template height)).
+    """
+    plan = compile_plan(df)
+    with Image.open(template) as image:  # 只读文件头
+        return plan, image.size
+
+
+def resolve_template(name):
+    """
+    A template name under assets/templates, or an absolute path.
+    """
+    if not name:
+        raise RequestError(400, "Missing 'template'.")
+    path = name if os.path.isabs(name) else pjoin(root(), 'assets', 'templates', name)
+    if not os.path.isfile(path):
+        raise RequestError(404, f"Template not found: {name}")
+    return path
+
+
+class RenderService(object):
+    """
+    Long-running local render service.
+
+    Requests are parsed in the event loop and compiled into render plans on a compile thread (so
+    glyph directory scans never stall other connections), queued, and a batcher
+    groups up to batch_size of them (waiting at most batch_window) into one call on a warm process
+    pool, so concurrent requests share the IPC round trip and the workers keep their glyph index,
+    font registry, layer caches and decoded templates between requests.
+    """
+    def __init__(self, workers=None, batch_size=8, batch_window=0.01, max_queue=256,
+                 preload_templates=(), fmt=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_queue = max_queue
+        self.fmt = fmt
+        self.preload_templates = [resolve_template(name) for name in preload_templates]
+        self.store = None
+        self.pool = None
+        self.compiler = None
+        self.queue = None
+        self.in_flight = 0
+        self.counters = collections.Counter()
+        self.latencies = collections.deque(maxlen=1000)
+        self.batch_sizes = collections.deque(maxlen=1000)
+        self.started = time.time()
+
+    async def start(self, host, port):
+        self.store = SharedImageStore.create(templates=self.preload_templates)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker,
+                                        initargs=(self.store.handle,))
+        # 单线程编译：计划缓存不是线程安全的；启动时先建好字体覆盖表，首个请求不必在此等待
+        self.compiler = ThreadPoolExecutor(max_workers=1)
+        await asyncio.get_running_loop().run_in_executor(self.compiler, font_coverage)
+        self.queue = asyncio.Queue()
+        self._batchers = [asyncio.ensure_future(self._batcher()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self.handle, host, port)
+        print(f"渲染服务已启动: http://{host}:{port}，{self.workers} 个渲染进程。")
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        for task in self._batchers:
+            task.cancel()
+        self.pool.shutdown(wait=True)
+        self.compiler.shutdown(wait=True)
+        self.store.close()
+        self.store.unlink()
+
+    # ---------------- 批处理 ----------------
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.in_flight += len(batch)
+            self.batch_sizes.append(len(batch))
+            try:
+                results = await loop.run_in_executor(self.pool, _render_batch, [job for job, _ in batch])
+            except Exception as e:
+                results = [(500, f"{type(e).__name__}: {e}")] * len(batch)
+            finally:
+                self.in_flight -= len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def render(self, payload):
+        """
+        Returns:
+            tuple: (encoded bytes, content type).
+        """
+        if not isinstance(payload, dict) or not isinstance(payload.get("rows"), list):
+            raise RequestError(400, "Body must be a JSON object with a 'rows' list.")
+        template = resolve_template(payload.get("template"))
+        if payload.get("format") is not None and not isinstance(payload["format"], str):
+            raise RequestError(400, "'format' must be a string.")
+        try:
+            job_fmt = output_format(payload.get("format") or self.fmt)
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        if not all(isinstance(row, dict) for row in payload["rows"]):
+            raise RequestError(400, "Every row must be an object with 文字/X/Y/大小/字体.")
+        df = pd.DataFrame(payload["rows"], columns=["文字", "X", "Y", "大小", "字体"])
+        try:
+            plan, (width, height) = await asyncio.get_running_loop().run_in_executor(
+                self.compiler, _compile_request, df, template)
+        except (ValueError, KeyError) as e:
+            raise RequestError(400, str(e))
+        except FileNotFoundError as e:  # 替代字在字库中没有对应目录
+            raise RequestError(400, f"Text cannot be formed from the glyph library: {e}")
+        for i, item in enumerate(plan.items):
+            if not (0 <= item.x < width and 0 <= item.y < height) or item.size <= 0:
+                raise RequestError(400, f"Row {i + 1}: position ({item.x}, {item.y}) or size {item.size} "
+                                        f"is outside the {width}x{height} template.")
+        seed = payload.get("seed")
+        if seed is None:
+            seed = random.getrandbits(32)
+        elif not isinstance(seed, int) or isinstance(seed, bool):
+            raise RequestError(400, "'seed' must be an integer.")
+        if self.queue.qsize() >= self.max_queue:
+            self.counters["rejected"] += 1
+            raise RequestError(503, "Render queue is full.")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((template, plan, seed, job_fmt), future))
+        result = await future
+        if isinstance(result, tuple):
+            raise RequestError(*result)
+        return result, CONTENT_TYPES.get(job_fmt.format, 'application/octet-stream')
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+
+        return {"queue_depth": self.queue.qsize(), "in_flight": self.in_flight,
+                "workers": self.workers, "uptime": time.time() - self.started,
+                "requests": dict(self.counters),
+                "latency": {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+                            "max": latencies[-1] if latencies else 0.0},
+                "batch_size": {"mean": sum(self.batch_sizes) / len(self.batch_sizes) if self.batch_sizes else 0.0,
+                               "max": max(self.batch_sizes, default=0)},
+                "shared_bytes": self.store.nbytes}
+
+    # ---------------- HTTP ----------------
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, b'', 'text/plain', close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                start = time.perf_counter()
+                status, content, content_type = await self._dispatch(method, path.split('?')[0], body)
+                if path.startswith('/render'):
+                    self.latencies.append(time.perf_counter() - start)
+                    self.counters[str(status)] += 1
+                await self._respond(writer, status, content, content_type, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        try:
+            if path == '/render':
+                if method != 'POST':
+                    raise RequestError(405, "Use POST.")
+                try:
+                    payload = json.loads(body.decode('utf-8'))
+                except ValueError:
+                    raise RequestError(400, "Body is not valid JSON.")
+                content, content_type = await self.render(payload)
+                return 200, content, content_type
+            if path == '/metrics':
+                return 200, json.dumps(self.metrics(), ensure_ascii=False).encode('utf-8'), 'application/json'
+            if path == '/health':
+                return 200, b'ok', 'text/plain'
+            raise RequestError(404, f"Unknown path: {path}")
+        except RequestError as e:
+            return e.status, json.dumps({"error": str(e)}, ensure_ascii=False).encode('utf-8'), 'application/json'
+        except Exception as e:
+            # 未预料的错误也返回响应，而不是直接断开连接
+            print(f"[Serve] 处理 {path} 失败: {type(e).__name__}: {e}")
+            return 500, json.dumps({"error": f"{type(e).__name__}: {e}"}, ensure_ascii=False).encode('utf-8'), \
+                'application/json'
+
+    async def _respond(self, writer, status, content, content_type, close=False):
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(content)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + content)
+        await writer.drain()
+
+
+async def serve(host=host, port=port, **kwargs):
+    service = RenderService(**kwargs)
+    server = await service.start(host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(host, port, workers=workers, batch_size=batch_size, batch_window=batch_window,
+                      max_queue=max_queue, preload_templates=preload_templates, fmt=fmt))
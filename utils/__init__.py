@@ -1,3 +1,13 @@
 from .utils import *
 from .write import *
 from .io import *
+from .cache import *
+from .atlas import *
+from .fonts import *
+from .glyphs import *
+from .profiling import *
+from .sinks import *
+from .tiles import *
+from .shared import *
+from .batch import *
+from .schedule import *
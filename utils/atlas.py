@@ -0,0 +1,97 @@
+import threading
+import numpy as np
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+
+class GlyphAtlas(object):
+    """
+    Per-(font, size) atlas of rasterized characters.
+
+    Every character is rasterized by FreeType once and kept as an alpha bitmap together with its
+    bbox and advance; strings are then composed by blitting the cached bitmaps with numpy, so the
+    rasterization cost scales with the number of distinct characters. Kerning is not applied,
+    which matches the CJK fonts under assets/fonts.
+
+    Filling the atlas is serialized by a lock, since the FreeType face is not thread-safe and the
+    prefetch thread (utils.schedule.Prefetcher) fills atlases while the render thread uses them.
+    """
+    def __init__(self, font):
+        self.font = font
+        self.glyphs = {}
+        self._lock = threading.Lock()
+
+    def glyph(self, char):
+        """
+        Returns:
+            tuple: (alpha bitmap or None for blank glyphs, (x0, y0, x1, y1) bbox, advance).
+        """
+        cached = self.glyphs.get(char)
+        if cached is not None:
+            return cached
+        with self._lock:
+            cached = self.glyphs.get(char)
+            if cached is None:
+                x0, y0, x1, y1 = self.font.getbbox(char)
+                bitmap = None
+                if x1 > x0 and y1 > y0:
+                    mask = Image.new('L', (x1 - x0, y1 - y0), 0)
+                    ImageDraw.Draw(mask).text((-x0, -y0), char, font=self.font, fill=255)
+                    bitmap = np.asarray(mask)
+                cached = (bitmap, (x0, y0, x1, y1), self.font.getlength(char))
+                self.glyphs[char] = cached
+        return cached
+
+    def render(self, text, padding=0):
+        """
+        Compose a string into an RGBA image laid out like ImageDraw.text at (0, 0).
+
+        Args:
+            text (str): The text to render.
+            padding (int): Extra rows added below the text box.
+
+        Returns:
+            PIL.Image.Image: Black text on a transparent background.
+        """
+        placed = []
+        pen = 0.0
+        x0 = y0 = float('inf')
+        x1 = y1 = float('-inf')
+        for char in text:
+            bitmap, (gx0, gy0, gx1, gy1), advance = self.glyph(char)
+            left = int(round(pen)) + gx0
+            placed.append((bitmap, left, gy0))
+            x0, y0 = min(x0, left), min(y0, gy0)
+            x1, y1 = max(x1, left + gx1 - gx0), max(y1, gy1)
+            pen += advance
+        if not placed:
+            return Image.new('RGBA', (0, padding), (255, 255, 255, 0))
+        width, height = int(x1 - x0), int(y1 - y0) + padding
+        alpha = np.zeros((height, width), dtype=np.uint8)
+        for bitmap, left, top in placed:
+            if bitmap is None:
+                continue
+            # 与 ImageDraw.text((0, 0)) 一致：按原点摆放，超出画布的部分裁掉
+            h, w = bitmap.shape
+            l, t = max(left, 0), max(top, 0)
+            r, b = min(left + w, width), min(top + h, height)
+            if r <= l or b <= t:
+                continue
+            region = alpha[t:b, l:r]
+            np.maximum(region, bitmap[t - top:b - top, l - left:r - left], out=region)
+        rgba = np.empty((height, width, 4), dtype=np.uint8)
+        # 与 ImageDraw.text 在透明白底上绘制黑字一致：有墨的像素(含抗锯齿边缘)为纯黑，只有 alpha 不同
+        rgba[..., :3] = np.where(alpha > 0, 0, 255)[..., None]
+        rgba[..., 3] = alpha
+        return Image.fromarray(rgba, 'RGBA')
+
+
+ATLAS_CACHE_SIZE = 64
+
+
+@lru_cache(maxsize=ATLAS_CACHE_SIZE)
+def get_atlas(font_path, font_size):
+    """
+    Return the shared GlyphAtlas of a (font path, size).
+    """
+    return GlyphAtlas(ImageFont.truetype(font_path, font_size))
@@ -71,11 +71,12 @@ def add_white_background(pil_img) -> np.ndarray:
 
 
 class Augmentation(object):
-    def __init__(self, source, mode='default'):
+    def __init__(self, source, mode='default', rng=None):
         
+        self.rng = random if rng is None else rng
         if isinstance(source, str):  # image path
-            self.imgp = imgp
-            self.image = cv2.imread(imgp, cv2.IMREAD_GRAYSCALE)
+            self.imgp = source
+            self.image = cv2.imread(source, cv2.IMREAD_GRAYSCALE)
         elif isinstance(source, Image.Image):  # PIL
             if source.mode == 'RGBA':
                 self.image = add_white_background(source)
@@ -112,7 +113,7 @@ class Augmentation(object):
 
         # Limit the number of regions based on region_count
         
-        selected_contours = random.choices(contours, k=region_count)
+        selected_contours = self.rng.choices(contours, k=region_count)
         
         points = []
         for cnt in selected_contours:
@@ -120,8 +121,8 @@ class Augmentation(object):
             x, y, w, h = cv2.boundingRect(cnt)
             
             def wrap_check(tarpoint, x, y, w, h):
-                ratio = random.uniform(0.2, 0.8)
-                x_up, y_up = random.choice([0,1]), random.choice([0,1])
+                ratio = self.rng.uniform(0.2, 0.8)
+                x_up, y_up = self.rng.choice([0,1]), self.rng.choice([0,1])
                 if x_up and y_up:
                     return True if tarpoint[0] <= int(x+w*ratio) and tarpoint[1] <= int(y+h*ratio) else False
                 elif x_up and not y_up:
@@ -135,7 +136,7 @@ class Augmentation(object):
 
             # Select a subset of points based on point_ratio
             try:
-                selected_points = random.sample(contour_points, max(1, int(len(contour_points) * point_ratio)))
+                selected_points = self.rng.sample(contour_points, max(1, int(len(contour_points) * point_ratio)))
             except:
                 pass
             points.extend(selected_points)
@@ -150,7 +151,7 @@ class Augmentation(object):
         """
         # Convert image to float for better manipulation
         
-        direction = (random.randint(0,5), random.randint(0,5))
+        direction = (self.rng.randint(0,5), self.rng.randint(0,5))
         # direction = (0,2)
         print(f"Direction is {direction}.")
         spread_image = self.binary_image.copy().astype(np.float32)
@@ -160,7 +161,7 @@ class Augmentation(object):
             spread_points = self._find_ink_spread_points(region_count=region_count, point_ratio=point_ratio)
         except:
             print("Cannot find ink spread.")
-            return self.binary_image
+            return cv2.cvtColor(255 - self.binary_image, cv2.COLOR_GRAY2RGB)
         
         # Create an empty mask to accumulate the spread effect
         mask = np.zeros_like(spread_image, dtype=np.float32)
@@ -216,8 +217,8 @@ class Augmentation(object):
             break_region_height = int(h * break_ratio)
             
             # Randomly select the starting point for the break region
-            break_x = random.randint(x, x + w - break_region_width)
-            break_y = random.randint(y, y + h - break_region_height)
+            break_x = self.rng.randint(x, x + w - break_region_width)
+            break_y = self.rng.randint(y, y + h - break_region_height)
             
             # Define the subregion to erode
             break_region = result_image[break_y:break_y + break_region_height, break_x:break_x + break_region_width]
@@ -236,7 +237,7 @@ class Augmentation(object):
     
     def run(self):
         if self.mode == "default":
-            is_spread = random.choice([0,1])
+            is_spread = self.rng.choice([0,1])
         if is_spread:
             print("Spread augmentation.")
             try:
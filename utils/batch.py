@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+from .cache import file_digest, config_digest
+
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+def job_hash(template, conf, seed=None, fmt=None, template_digest=None):
+    """
+    Hash of everything that determines a page: template content, config rows, seed and format.
+
+    Args:
+        template_digest (str, optional): file_digest(template) computed once per batch by the caller.
+    """
+    fmt = fmt if fmt is None or isinstance(fmt, str) else list(fmt)
+    template_digest = template_digest or file_digest(template)
+    payload = json.dumps([template_digest, config_digest(conf), seed, fmt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class BatchManifest(object):
+    """
+    Checkpoint manifest of a batch run, one record per job:
+    {config, hash, output, status, duration, error, updated}.
+
+    The manifest is rewritten atomically (tmp file + os.replace) at most every `save_interval`
+    seconds and on close, so a crash loses at most the last few status updates. Outputs are
+    written atomically as well, hence a job whose `done` record was lost is simply rendered again.
+    A rerun skips jobs that are done with the same hash and whose output still exists, and runs
+    pending, failed and changed jobs.
+
+    save() runs on whatever thread reports the status, e.g. the AsyncWriter thread through a page
+    callback, so a failed rewrite (locked file, full disk) never raises: it is recorded in `errors`
+    and retried on the next save.
+
+    Usage:
+        manifest = BatchManifest(pjoin(save_root, "batch.json"))
+        if manifest.should_run(key, h, save_p):
+            manifest.start(key, h, save_p)
+            ...
+            manifest.finish(key)  # or manifest.fail(key, e)
+        manifest.close()
+    """
+    def __init__(self, path, save_interval=1.0, resume=True):
+        """
+        Args:
+            path (str): Manifest file.
+            save_interval (float): Minimum seconds between two rewrites.
+            resume (bool): Load the records of a previous run; False starts an empty manifest, e.g. for
+                           an archive that is written anew on every run.
+        """
+        self.path = path
+        self.save_interval = save_interval
+        self.jobs = {}
+        self.errors = []  # 写入清单失败的异常
+        self._started = {}
+        self._dirty = False
+        self._last_save = 0.0
+        self._lock = threading.Lock()
+        if resume and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.jobs = json.load(f).get("jobs", {})
+            except (OSError, ValueError):
+                print(f"{path} 无法读取，全部重新生成。")
+
+    def should_run(self, key, hash_, output):
+        job = self.jobs.get(key)
+        if job is None or job.get("status") != DONE:
+            return True
+        return job.get("hash") != hash_ or job.get("output") != output or not os.path.exists(output)
+
+    def _update(self, key, **fields):
+        with self._lock:
+            job = self.jobs.setdefault(key, {"config": key})
+            job.update(fields, updated=datetime.now().isoformat(timespec='seconds'))
+            self._dirty = True
+        self.save()
+
+    def start(self, key, hash_, output):
+        self._started[key] = time.perf_counter()
+        self._update(key, hash=hash_, output=output, status=RUNNING, duration=None, error=None)
+
+    def _duration(self, key):
+        start = self._started.pop(key, None)
+        return None if start is None else time.perf_counter() - start
+
+    def finish(self, key):
+        self._update(key, status=DONE, duration=self._duration(key), error=None)
+
+    def fail(self, key, error):
+        message = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        self._update(key, status=FAILED, duration=self._duration(key), error=message)
+
+    def save(self, force=False):
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._last_save < self.save_interval):
+                return
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            self._last_save = time.time()
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump({"jobs": self.jobs}, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                # 保持 _dirty，下次保存时重试
+                self.errors.append(e)
+                print(f"[Batch] 写入 {self.path} 失败: {e}")
+                return
+            self._dirty = False
+
+    def close(self):
+        self.save(force=True)
+
+    def summary(self):
+        """
+        Returns:
+            dict: Number of jobs per status.
+        """
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.get("status", PENDING)] = counts.get(job.get("status", PENDING), 0) + 1
+        return counts
+
+    def failed(self):
+        return {key: job.get("error") for key, job in self.jobs.items() if job.get("status") == FAILED}
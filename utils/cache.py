@@ -0,0 +1,212 @@
+import os
+import json
+import random
+import shutil
+import hashlib
+from collections import OrderedDict
+from .utils import root, pjoin, render_rows, document_seed
+
+
+_FILE_DIGESTS = {}
+
+
+def file_digest(path):
+    """
+    Return the sha256 of a file's content, memoized by (path, mtime, size).
+
+    Args:
+        path (str): File to hash.
+
+    Returns:
+        str: Hex digest of the file content.
+    """
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    digest = _FILE_DIGESTS.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _FILE_DIGESTS[memo_key] = digest
+    return digest
+
+
+def asset_version(directories=None):
+    """
+    Fingerprint the glyph and font stores from file names, sizes and mtimes.
+
+    Args:
+        directories (list of str, optional): Directories to scan, defaults to assets/imgs and assets/fonts.
+
+    Returns:
+        str: Hex digest that changes whenever an asset is added, removed or modified.
+    """
+    if directories is None:
+        directories = [pjoin(root(), 'assets', 'imgs'), pjoin(root(), 'assets', 'fonts')]
+    h = hashlib.sha256()
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for name in sorted(filenames):
+                p = pjoin(dirpath, name)
+                st = os.stat(p)
+                h.update(f"{os.path.relpath(p, directory)}|{st.st_size}|{st.st_mtime_ns}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+def config_digest(conf):
+    """
+    Hash the normalized render rows of a config DataFrame or RenderPlan.
+    """
+    rows = conf.rows() if hasattr(conf, 'rows') else render_rows(conf)
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class RenderCache(object):
+    """
+    Content-addressed cache of rendered pages.
+
+    A page is stored under the hash of (template, config rows, seed, asset-store version), so a
+    rerun with unchanged inputs copies the cached page instead of rendering again.
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or pjoin(root(), 'tmp', 'render_cache')
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self._asset_version = None
+
+    @property
+    def asset_version(self):
+        # 资源库扫描代价较高，每个缓存实例只计算一次，资源变动后调用 refresh()
+        if self._asset_version is None:
+            self._asset_version = asset_version()
+        return self._asset_version
+
+    def refresh(self):
+        self._asset_version = None
+
+    def key(self, imgp, conf, seed):
+        payload = json.dumps([file_digest(imgp), config_digest(conf), seed, self.asset_version])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return pjoin(self.cache_dir, f"{key}.png")
+
+    def get(self, key):
+        p = self.path(key)
+        return p if os.path.exists(p) else None
+
+    def put(self, key, image):
+        # 先写临时文件再替换，避免中断时留下残缺的缓存项
+        p = self.path(key)
+        tmp = f"{p}.{os.getpid()}.tmp"
+        image.save(tmp, format='PNG', compress_level=1)  # 缓存项只求写得快，与 png-fast 相同
+        os.replace(tmp, p)
+        return p
+
+    def put_file(self, key, path):
+        """
+        Store an already written PNG page, e.g. one streamed by render_tiled.
+        """
+        p = self.path(key)
+        tmp = f"{p}.{os.getpid()}.tmp"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, p)
+        return p
+
+
+class LayerCache(object):
+    """
+    LRU cache of rendered RGBA layers, bounded by the memory of the stored pixels.
+
+    Cached layers are shared, callers must not modify them in place.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._layers = OrderedDict()
+
+    def __len__(self):
+        return len(self._layers)
+
+    @staticmethod
+    def sizeof(image):
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, key):
+        image = self._layers.get(key)
+        if image is not None:
+            self._layers.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        if key in self._layers:
+            self.nbytes -= self.sizeof(self._layers.pop(key))
+        self._layers[key] = image
+        self.nbytes += self.sizeof(image)
+        while self.nbytes > self.max_bytes and len(self._layers) > 1:
+            _, old = self._layers.popitem(last=False)
+            self.nbytes -= self.sizeof(old)
+        return image
+
+    def get_or_create(self, key, factory):
+        image = self.get(key)
+        if image is None:
+            self.misses += 1
+            image = self.put(key, factory())
+        else:
+            self.hits += 1
+        return image
+
+    def stats(self):
+        """
+        Returns:
+            dict: entries, bytes, hits, misses and hit_rate of get_or_create calls.
+        """
+        total = self.hits + self.misses
+        return {"entries": len(self._layers), "bytes": self.nbytes, "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def clear(self):
+        self._layers.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+class VariantPool(object):
+    """
+    Pool of K pre-composed renderings per key, e.g. (text, height) of a handwritten word.
+
+    Each request picks one of the K slots with the caller's rng; a slot is built once with a seed
+    derived from (key, slot), so output stays varied and reproducible while repeats, across
+    documents too, are cache hits. Per-document variety comes from the document rng's slot choice.
+    Setting `seed` (e.g. per batch) gives the slots different variants without affecting reuse.
+    """
+    def __init__(self, pool_size=16, max_bytes=256 * 1024 * 1024, seed=None):
+        self.pool_size = pool_size
+        self.seed = seed
+        self.layers = LayerCache(max_bytes)
+
+    def get(self, key, factory, rng=None):
+        """
+        Args:
+            key (tuple): Hashable key of the rendering, e.g. (text, height).
+            factory (callable): factory(rng) -> PIL image, builds one variant.
+            rng (random.Random, optional): Random source choosing the slot.
+        """
+        rng = random if rng is None else rng
+        if self.pool_size <= 0:
+            return factory(rng)
+        slot = rng.randrange(self.pool_size)
+        base = slot if self.seed is None else f"{self.seed}:{slot}"
+        return self.layers.get_or_create(
+            key + (self.seed, slot), lambda: factory(random.Random(document_seed(repr(key), base=base))))
+
+
+handwrite_pool = VariantPool()
+text_layer_cache = LayerCache(max_bytes=128 * 1024 * 1024)  # TTF 文字层，键为 (文字, 字体路径, 大小)
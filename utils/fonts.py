@@ -0,0 +1,130 @@
+import os
+import struct
+from functools import lru_cache
+from .utils import root, pjoin
+
+
+def read_cmap(font_path):
+    """
+    Read the set of code points a TrueType/OpenType font maps to glyphs.
+
+    Only the Unicode cmap subtables (format 4 and 12) are parsed, which is what the fonts under
+    assets/fonts use.
+
+    Args:
+        font_path (str): Path of a .ttf/.otf file.
+
+    Returns:
+        frozenset: Covered code points, empty if the font has no Unicode cmap.
+    """
+    with open(font_path, 'rb') as f:
+        data = f.read()
+    num_tables = struct.unpack_from('>H', data, 4)[0]
+    cmap_offset = None
+    for i in range(num_tables):
+        tag, _, offset, _ = struct.unpack_from('>4sIII', data, 12 + 16 * i)
+        if tag == b'cmap':
+            cmap_offset = offset
+            break
+    if cmap_offset is None:
+        return frozenset()
+    _, num_subtables = struct.unpack_from('>HH', data, cmap_offset)
+    subtables = {}
+    for i in range(num_subtables):
+        platform, encoding, offset = struct.unpack_from('>HHI', data, cmap_offset + 4 + 8 * i)
+        subtables[(platform, encoding)] = cmap_offset + offset
+    codepoints = set()
+    # 优先使用完整 Unicode 表(format 12)，否则使用 BMP 表(format 4)
+    for key in [(3, 10), (0, 4), (0, 6), (3, 1), (0, 3), (0, 1), (0, 0)]:
+        if key not in subtables:
+            continue
+        offset = subtables[key]
+        fmt = struct.unpack_from('>H', data, offset)[0]
+        if fmt == 12:
+            num_groups = struct.unpack_from('>I', data, offset + 12)[0]
+            for g in range(num_groups):
+                start, end, _ = struct.unpack_from('>III', data, offset + 16 + 12 * g)
+                codepoints.update(range(start, end + 1))
+            break
+        if fmt == 4:
+            seg_count = struct.unpack_from('>H', data, offset + 6)[0] // 2
+            ends = struct.unpack_from(f'>{seg_count}H', data, offset + 14)
+            starts = struct.unpack_from(f'>{seg_count}H', data, offset + 16 + 2 * seg_count)
+            deltas = struct.unpack_from(f'>{seg_count}h', data, offset + 16 + 4 * seg_count)
+            range_base = offset + 16 + 6 * seg_count
+            range_offsets = struct.unpack_from(f'>{seg_count}H', data, range_base)
+            for s, (start, end, delta, range_offset) in enumerate(zip(starts, ends, deltas, range_offsets)):
+                if start == 0xFFFF:
+                    continue
+                if range_offset == 0:
+                    codepoints.update(c for c in range(start, end + 1) if (c + delta) & 0xFFFF)
+                    continue
+                for c in range(start, end + 1):
+                    glyph_offset = range_base + 2 * s + range_offset + 2 * (c - start)
+                    if glyph_offset + 2 <= len(data) and struct.unpack_from('>H', data, glyph_offset)[0]:
+                        codepoints.add(c)
+            break
+    return frozenset(codepoints)
+
+
+def font_coverage(directory=None):
+    """
+    Coverage map of every font in a directory, built once per process.
+
+    Args:
+        directory (str, optional): Font directory, defaults to assets/fonts.
+
+    Returns:
+        dict: {font path: frozenset of covered code points}.
+    """
+    return _font_coverage(directory or pjoin(root(), 'assets', 'fonts'))
+
+
+@lru_cache(maxsize=None)
+def _font_coverage(directory):
+    coverage = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.ttf', '.otf')):
+            try:
+                coverage[pjoin(directory, name)] = read_cmap(pjoin(directory, name))
+            except (OSError, struct.error):
+                print(f"[Warning] 无法读取 {name} 的字符表。")
+    return coverage
+
+
+def missing_chars(text, font_path):
+    """
+    Characters of text that a font from the coverage map cannot render.
+    """
+    covered = font_coverage(os.path.dirname(font_path)).get(font_path, frozenset())
+    return [c for c in text if not c.isspace() and ord(c) not in covered]
+
+
+def resolve_fallback_fonts(text, exception=None):
+    """
+    Candidate fonts for text, chosen from the coverage map instead of at random.
+
+    Preference order: fonts outside `exception` that cover every character, then any font that
+    covers every character, then the non-excepted fonts with the best coverage.
+
+    Args:
+        text (str): Text to render.
+        exception (list, optional): Font file names to avoid, e.g. ["宋体.ttf"].
+
+    Returns:
+        tuple: Font paths, a random one of them may be used.
+    """
+    exception = exception or []
+    coverage = font_coverage()
+    codes = {ord(c) for c in text if not c.isspace()}
+    allowed = [p for p in coverage if os.path.basename(p) not in exception] or list(coverage)
+    if not allowed:
+        raise FileNotFoundError("No TTF files found in the specified directory.")
+    full = [p for p in allowed if codes <= coverage[p]]
+    if full:
+        return tuple(full)
+    full = [p for p in coverage if codes <= coverage[p]]
+    if full:
+        return tuple(full)
+    best = max(len(codes & coverage[p]) for p in allowed)
+    return tuple(p for p in allowed if len(codes & coverage[p]) == best)
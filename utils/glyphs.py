@@ -0,0 +1,146 @@
+import os
+from functools import lru_cache
+from PIL import Image
+from .utils import root, pjoin
+from .profiling import profiler
+from .shared import shared_glyph
+
+
+PYRAMID_HEIGHTS = (32, 64, 128)  # 预先缩小的层级高度
+TRIM_GLYPHS = True  # 裁掉字形四周的透明边
+RESAMPLE = {'quality': Image.BICUBIC, 'fast': Image.BILINEAR}
+RESAMPLE_MODE = 'quality'
+PYRAMID_CACHE_SIZE = 4096  # 常驻的字形金字塔数量
+
+
+class GlyphPyramid(object):
+    """
+    A glyph trimmed to its ink bounding box, with a few pre-downscaled levels.
+
+    levels is sorted by height and always ends with the full-resolution (trimmed) image, so a
+    resize at runtime starts from the nearest larger level instead of the source scan. The trim
+    offset and the source size are kept, and resize returns the glyph at the scale of the untrimmed
+    scan with its original margins, so spacing and size match resizing the scan itself.
+    """
+    __slots__ = ('levels', 'offset', 'source_size')
+
+    def __init__(self, image, heights=PYRAMID_HEIGHTS, trim=TRIM_GLYPHS, box=None):
+        """
+        Args:
+            image (PIL.Image.Image): The glyph scan, or an already trimmed glyph together with box.
+            heights (tuple of int): Heights of the pre-downscaled levels.
+            trim (bool): Trim the scan to its alpha bounding box.
+            box (tuple, optional): (left, top, source width, source height) of an image that was
+                                   trimmed beforehand, e.g. by SharedImageStore.
+        """
+        if image.mode != "RGBA":
+            image = image.convert("RGBA")
+        if box is None:
+            box = (0, 0) + image.size
+            if trim:
+                bbox = image.getchannel('A').getbbox()
+                if bbox and bbox != (0, 0) + image.size:
+                    image = image.crop(bbox)
+                    box = bbox[:2] + box[2:]
+        self.offset = box[:2]
+        self.source_size = box[2:]
+        aspect = image.width / image.height
+        self.levels = [image.resize((max(1, round(aspect * h)), h), Image.LANCZOS)
+                       for h in sorted(heights) if h < image.height]
+        self.levels.append(image)
+
+    def level_for(self, height):
+        for level in self.levels:
+            if level.height >= height:
+                return level
+        return self.levels[-1]
+
+    def resize(self, height, resample=None):
+        """
+        Args:
+            height (int): Target height of the untrimmed glyph.
+            resample (str, optional): 'quality' or 'fast', defaults to RESAMPLE_MODE.
+
+        Returns:
+            PIL.Image.Image: The glyph at the target height, aspect ratio and margins kept.
+        """
+        source_width, source_height = self.source_size
+        scale = height / source_height
+        width = max(1, int(source_width / source_height * height))
+        ink = self.levels[-1]
+        ink_size = (max(1, min(width, round(ink.width * scale))), max(1, min(height, round(ink.height * scale))))
+        level = self.level_for(ink_size[1])
+        if level.size != ink_size:
+            with profiler.stage("resize"):
+                level = level.resize(ink_size, RESAMPLE[resample or RESAMPLE_MODE])
+        if level.size == (width, height):
+            return level
+        # 按原扫描的比例放回透明边，字间距与大小与直接缩放原图一致
+        x = min(round(self.offset[0] * scale), width - ink_size[0])
+        y = min(round(self.offset[1] * scale), height - ink_size[1])
+        canvas = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        canvas.paste(level, (x, y))
+        return canvas
+
+
+@lru_cache(maxsize=PYRAMID_CACHE_SIZE)
+def _load_pyramid(path, mtime_ns):
+    shared = shared_glyph(path, mtime_ns)
+    if shared is not None:
+        image, box = shared
+        return GlyphPyramid(image, box=box)
+    with profiler.stage("decode"):
+        return GlyphPyramid(Image.open(path))
+
+
+def load_pyramid(path):
+    """
+    Return the GlyphPyramid of a glyph file, built once while the file is unchanged.
+    """
+    return _load_pyramid(path, os.stat(path).st_mtime_ns)
+
+
+def load_glyph(path, height, resample=None):
+    """
+    Load a glyph file at a target height through its pyramid.
+    """
+    return load_pyramid(path).resize(height, resample)
+
+
+def set_resample_mode(mode):
+    """
+    Switch glyph resampling between 'quality' (bicubic) and 'fast' (bilinear).
+    """
+    global RESAMPLE_MODE
+    if mode not in RESAMPLE:
+        raise ValueError(f"Unknown resample mode: {mode}")
+    RESAMPLE_MODE = mode
+
+
+def preload_glyphs(charas=None, limit=None):
+    """
+    Build the pyramids of all glyph variants of the given glyph directories ahead of time.
+
+    Args:
+        charas (iterable of str, optional): Directory names under assets/imgs, defaults to all.
+        limit (int, optional): Most glyph files to load, split evenly over the directories, so a
+                               preload does not evict pyramids that are in use from the cache.
+
+    Returns:
+        int: Number of glyph files loaded.
+    """
+    directory = pjoin(root(), 'assets', 'imgs')
+    charas = sorted(os.listdir(directory) if charas is None else charas)
+    per_dir = None if limit is None else -(-limit // max(1, len(charas)))
+    count = 0
+    for chara in charas:
+        chara_dir = pjoin(directory, chara)
+        if not os.path.isdir(chara_dir):
+            continue
+        names = sorted(x for x in os.listdir(chara_dir) if x.endswith('.png'))
+        for name in names[:per_dir]:
+            if limit is not None and count >= limit:
+                return count
+            load_pyramid(pjoin(chara_dir, name))
+            count += 1
+    return count
@@ -0,0 +1,374 @@
+import os
+import queue
+import socket
+import threading
+from collections import OrderedDict, namedtuple
+import pandas as pd
+from PIL import Image
+from .profiling import profiler
+
+
+CONFIG_EXTENSIONS = ['.xlsx', '.csv', '.parquet', '.feather', '.ndjson', '.jsonl']
+BATCH_EXTENSIONS = ['.parquet', '.feather', '.ndjson', '.jsonl']
+BATCH_COLUMN = "配置"  # 批量文件中区分各个配置的列
+BATCH_SEP = "::"  # 批量文件中单个配置的键：<文件路径>::<配置名>
+CONFIG_CACHE_SIZE = 512
+
+_CONFIG_CACHE = OrderedDict()
+
+
+def _ext(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def _binary_safe(df):
+    """
+    Arrow-based formats need one type per column, so mixed object columns (e.g. numbers and
+    names in 文字) are turned into strings, missing values are kept.
+    """
+    df = df.reset_index(drop=True)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].map(lambda v: v if isinstance(v, str) or pd.isna(v) else str(v))
+    return df
+
+
+def _read_frame(path):
+    ext = _ext(path)
+    if ext == '.xlsx':
+        return pd.read_excel(path)
+    elif ext == '.csv':
+        return pd.read_csv(path)
+    elif ext == '.parquet':
+        return pd.read_parquet(path)
+    elif ext == '.feather':
+        return pd.read_feather(path)
+    elif ext in ('.ndjson', '.jsonl'):
+        return pd.read_json(path, orient='records', lines=True, dtype=False)
+    raise ValueError(f"Unsupported file format: {path}")
+
+
+def read_config(path):
+    """
+    Read a config file, reusing the parsed result while the file is unchanged.
+
+    Args:
+        path (str): Path of a .xlsx/.csv/.parquet/.feather/.ndjson/.jsonl file.
+
+    Returns:
+        pd.DataFrame: A copy of the parsed config, safe to modify.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    df = _CONFIG_CACHE.get(key)
+    if df is None:
+        df = _read_frame(path)
+        _CONFIG_CACHE[key] = df
+        while len(_CONFIG_CACHE) > CONFIG_CACHE_SIZE:
+            _CONFIG_CACHE.popitem(last=False)
+    else:
+        _CONFIG_CACHE.move_to_end(key)
+    return df.copy()
+
+
+def write_config(df, path):
+    """
+    Write a config in the format given by the file extension.
+    """
+    ext = _ext(path)
+    if ext == '.xlsx':
+        df.to_excel(path, index=False)
+    elif ext == '.csv':
+        df.to_csv(path, index=False)
+    elif ext == '.parquet':
+        _binary_safe(df).to_parquet(path, index=False)
+    elif ext == '.feather':
+        _binary_safe(df).to_feather(path)
+    elif ext in ('.ndjson', '.jsonl'):
+        df.to_json(path, orient='records', lines=True, force_ascii=False)
+    else:
+        raise ValueError(f"Unsupported file format: {path}")
+
+
+def is_config_batch(path):
+    """
+    Whether a file holds many configs, i.e. a binary/NDJSON file with a 配置 column.
+    """
+    return _ext(path) in BATCH_EXTENSIONS and BATCH_COLUMN in read_config(path).columns
+
+
+def write_config_batch(configs, path):
+    """
+    Write many configs into one file.
+
+    Args:
+        configs (dict): {name: config DataFrame}.
+        path (str): Output path, .parquet/.feather/.ndjson/.jsonl.
+    """
+    if _ext(path) not in BATCH_EXTENSIONS:
+        raise ValueError(f"Unsupported batch format: {path}")
+    frames = [df.assign(**{BATCH_COLUMN: str(name)}) for name, df in configs.items()]
+    write_config(pd.concat(frames, ignore_index=True), path)
+
+
+def read_config_batch(path):
+    """
+    Read a batch file written by write_config_batch.
+
+    Returns:
+        dict: {"<path>::<name>": config DataFrame}, in file order.
+    """
+    data = read_config(path)
+    return {
+        f"{path}{BATCH_SEP}{name}": df.drop(columns=BATCH_COLUMN).reset_index(drop=True)
+        for name, df in data.groupby(BATCH_COLUMN, sort=False)
+    }
+
+
+def config_stem(key):
+    """
+    Output name of a config key: the file stem, or the config name inside a batch file.
+    """
+    if BATCH_SEP in key:
+        return key.split(BATCH_SEP)[-1]
+    return os.path.splitext(os.path.split(key)[-1])[0]
+
+
+def expand_config_files(files):
+    """
+    Expand selected files into config entries, one per config inside batch files.
+
+    Returns:
+        dict: {key: path or DataFrame}, suitable for check_format.
+    """
+    entries = {}
+    for file_name in files:
+        try:
+            batch = is_config_batch(file_name)
+        except Exception:
+            batch = False  # 交给 check_format 报告
+        if batch:
+            entries.update(read_config_batch(file_name))
+        else:
+            entries[file_name] = file_name
+    return entries
+
+
+# 输出格式：PIL 的格式名、扩展名、保存前转换的模式（None 为保持 RGBA）与保存参数
+OutputFormat = namedtuple('OutputFormat', ['format', 'ext', 'mode', 'params'])
+
+OUTPUT_FORMATS = {
+    'png': OutputFormat('PNG', '.png', None, {}),
+    'png-fast': OutputFormat('PNG', '.png', None, {'compress_level': 1}),
+    'png-rgb': OutputFormat('PNG', '.png', 'RGB', {'compress_level': 1}),
+    'png-gray': OutputFormat('PNG', '.png', 'L', {'compress_level': 1}),
+    'jpeg': OutputFormat('JPEG', '.jpg', 'RGB', {'quality': 90}),
+    'jpeg-gray': OutputFormat('JPEG', '.jpg', 'L', {'quality': 90}),
+    'webp': OutputFormat('WEBP', '.webp', 'RGB', {'quality': 90, 'method': 0}),
+}
+
+
+_FORMAT_BY_EXT = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.webp': 'webp'}
+
+
+def output_format(fmt=None, path=None):
+    """
+    Resolve an output format.
+
+    Args:
+        fmt (str | OutputFormat, optional): A key of OUTPUT_FORMATS or a custom OutputFormat.
+        path (str, optional): Without fmt, the format follows the extension of path; .png and
+                              unknown extensions use 'png' (Pillow's default settings).
+
+    Returns:
+        OutputFormat: The resolved format.
+    """
+    if fmt is None:
+        return OUTPUT_FORMATS[_FORMAT_BY_EXT.get(_ext(path or ''), 'png')]
+    if isinstance(fmt, OutputFormat):
+        return fmt
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {fmt}")
+    return OUTPUT_FORMATS[fmt]
+
+
+def flatten_image(image, mode):
+    """
+    Flatten an RGBA page onto white and convert it to mode ('RGB' or 'L').
+    """
+    if mode is None or image.mode == mode:
+        return image
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        # 以 alpha 为蒙版贴到白底上，与 alpha_composite 结果一致但快得多
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, (0, 0), image)
+        image = background
+    return image.convert(mode)
+
+
+def save_image(image, path, fmt=None):
+    """
+    Save a rendered page in the given output format.
+
+    Args:
+        image (PIL.Image.Image): The page.
+        path (str | file): Output path or binary file object. Paths are written to a temporary
+                           file first and renamed, so an interrupted save never leaves a partial page.
+        fmt (str | OutputFormat, optional): See output_format, defaults to the format of the extension.
+    """
+    fmt = output_format(fmt, path if isinstance(path, str) else None)
+    image = flatten_image(image, fmt.mode)
+    if not isinstance(path, str):
+        image.save(path, format=fmt.format, **fmt.params)
+        return path
+    with atomic_output(path) as tmp:
+        image.save(tmp, format=fmt.format, **fmt.params)
+    return path
+
+
+class atomic_output(object):
+    """
+    Context manager yielding a temporary path next to `path`, renamed onto `path` on success and
+    removed on failure. The name carries host, process and thread, so writers sharing a directory
+    (threads, or nodes on a network mount) never share a temporary file.
+
+    Usage:
+        with atomic_output(path) as tmp:
+            write(tmp)
+    """
+    def __init__(self, path):
+        self.path = path
+        self.tmp = f"{path}.{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def __enter__(self):
+        return self.tmp
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            os.replace(self.tmp, self.path)
+        elif os.path.exists(self.tmp):
+            os.remove(self.tmp)
+        return False
+
+
+_STOP = object()
+
+
+class AsyncWriter(object):
+    """
+    Background thread that encodes and writes pages and log lines, so encoding overlaps the next
+    render.
+
+    The queue is bounded: save() blocks once max_pending pages are waiting, which keeps memory
+    bounded when rendering is faster than encoding. Images handed to save() must not be modified
+    afterwards. Log files are opened once and written through a buffer instead of reopened per line.
+
+    Usage:
+        with AsyncWriter(fmt='png-fast') as writer:
+            writer.log(logfile, "...")
+            writer.save(image, path)
+    """
+    def __init__(self, fmt=None, max_pending=4):
+        self.fmt = fmt
+        self.errors = []  # [(path, exception)]
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._logs = {}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                kind, path, payload, fmt = item
+                try:
+                    self._process(kind, path, payload, fmt)
+                except Exception as e:
+                    # 日志写入与回调出错同样只记录，写入线程继续取空队列，save() 与 close() 不会卡住
+                    self.errors.append((path, e))
+                    print(f"[Writer] 处理 {path} 失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _process(self, kind, path, payload, fmt):
+        if kind == 'log':
+            f = self._logs.get(path)
+            if f is None:
+                f = self._logs[path] = open(path, 'a', encoding='utf-8')
+            f.write(payload + '\n')
+            return
+        if kind == 'flush':
+            for f in self._logs.values():
+                f.flush()
+            return
+        callback = payload[-1]
+        error = None
+        try:
+            if kind == 'call':
+                fn, args, _ = payload
+                fn(*args)
+            else:
+                image, _ = payload
+                with profiler.stage("save"):
+                    save_image(image, path, fmt)
+            self.written += 1
+        except Exception as e:
+            error = e
+            self.errors.append((path, e))
+            print(f"[Writer] 写入 {path} 失败: {e}")
+        if callback is not None:
+            callback(error)
+
+    def save(self, image, path, fmt=None, callback=None):
+        """
+        Queue a page for writing, blocks while the queue is full.
+
+        Args:
+            callback (callable, optional): callback(error) called on the writer thread once the page
+                                           is written (error is None) or failed.
+        """
+        self._queue.put(('image', path, (image, callback), self.fmt if fmt is None else fmt))
+        return path
+
+    def submit(self, fn, name, *args, callback=None):
+        """
+        Queue an arbitrary write, e.g. submit(sink.write, name, image); name is used in errors.
+
+        Args:
+            callback (callable, optional): callback(error) called on the writer thread afterwards, as in save().
+        """
+        self._queue.put(('call', name, (fn, (name,) + args, callback), None))
+
+    def log(self, path, content):
+        """
+        Queue a line for a log file, the buffered counterpart of write_log.
+        """
+        self._queue.put(('log', path, content, None))
+
+    def flush(self):
+        """
+        Wait until everything queued so far is written.
+        """
+        self._queue.put(('flush', None, None, None))
+        self._queue.join()
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        self.flush()
+        self._queue.put(_STOP)
+        self._thread.join()
+        for f in self._logs.values():
+            f.close()
+        self._logs = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import threading
+import tracemalloc
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+STAGE_NAMES = {
+    "parse": "解析", "segment": "分割", "lookup": "查字", "decode": "解码", "resize": "缩放",
+    "augment": "增强", "rasterize": "字体", "composite": "合成", "save": "保存",
+}
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def current_rss():
+    """
+    Current resident set size of this process in bytes, or None where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """
+    Peak resident set size over the whole process lifetime in bytes, or None on Windows.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss 在 Linux 上以 KB 计，在 macOS 上以字节计
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class _Stage(object):
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _Document(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._begin(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._end(error=None if exc is None else str(exc))
+        return False
+
+
+class Profiler(object):
+    """
+    Timing and counting hooks around the render stages, with per-document and per-batch reports.
+
+    Stage times are inclusive (a stage nested in another is counted in both). When disabled,
+    stage() and document() return a shared no-op context manager, so the hooks cost one call.
+
+    Memory per document: rss_delta_bytes is the change of the current RSS over the document (it
+    includes Pillow's C buffers, which tracemalloc does not see), and with track_memory
+    peak_traced_bytes is the tracemalloc peak of Python allocations. The process-lifetime RSS
+    peak is reported once per batch as peak_rss_bytes.
+
+    The current document is tracked per thread: stages recorded on a thread that has no open
+    document (the glyph prefetcher, the async writer) only count towards the batch totals.
+
+    Usage:
+        with profiler.document("0001.png"):
+            with profiler.stage("decode"):
+                ...
+        profiler.report()  # JSON-serializable dict
+    """
+    def __init__(self, enabled=False, track_memory=False):
+        self.enabled = enabled
+        self.track_memory = track_memory
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.documents = []
+            self.batch = {}
+            self._local = threading.local()
+            self._batch_start = time.perf_counter()
+
+    def enable(self, track_memory=False):
+        self.enabled = True
+        self.track_memory = track_memory
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def document(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Document(self, name)
+
+    def add(self, name, seconds, count=1):
+        doc = getattr(self._local, "doc", None)
+        with self._lock:
+            for stages in (self.batch, doc["stages"] if doc else None):
+                if stages is None:
+                    continue
+                entry = stages.setdefault(name, {"time": 0.0, "count": 0})
+                entry["time"] += seconds
+                entry["count"] += count
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.add(name, 0.0, n)
+
+    def _begin(self, name):
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self._local.doc = {"name": name, "stages": {}, "start": time.perf_counter(), "rss": current_rss()}
+
+    def _end(self, error=None):
+        doc, self._local.doc = getattr(self._local, "doc", None), None
+        if doc is None:
+            return
+        doc["total"] = time.perf_counter() - doc.pop("start")
+        if error:
+            doc["error"] = error
+        if self.track_memory:
+            doc["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        rss_start, rss = doc.pop("rss"), current_rss()
+        if rss is not None:
+            doc["rss_bytes"] = rss
+            doc["rss_delta_bytes"] = rss - rss_start
+        with self._lock:
+            self.documents.append(doc)
+
+    def report(self):
+        """
+        Returns:
+            dict: {"documents": [per-document report], "batch": {stage: {time, count}}, "total": seconds,
+                   "peak_rss_bytes": process-lifetime RSS peak or None}.
+        """
+        with self._lock:
+            return {"documents": [dict(doc) for doc in self.documents],
+                    "batch": {k: dict(v) for k, v in self.batch.items()},
+                    "total": time.perf_counter() - self._batch_start,
+                    "peak_rss_bytes": peak_rss()}
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def summary(self):
+        """
+        One-line summary, e.g. "3 页 4.21s | 解码 1.02s 字体 0.31s ... | 进程峰值内存 812MB".
+        """
+        report = self.report()
+        docs = report["documents"]
+        total = sum(doc["total"] for doc in docs)
+        stages = sorted(report["batch"].items(), key=lambda kv: -kv[1]["time"])
+        parts = " ".join(f"{STAGE_NAMES.get(k, k)} {v['time']:.2f}s" for k, v in stages if v["time"] > 0)
+        peak = report["peak_rss_bytes"] or max((doc.get("peak_traced_bytes", 0) for doc in docs), default=0)
+        line = f"{len(docs)} 页 {total:.2f}s | {parts}"
+        if peak:
+            line += f" | 进程峰值内存 {peak / 1024 / 1024:.0f}MB"
+        return line
+
+
+profiler = Profiler(enabled=os.environ.get("DRAFTSCULPTOR_PROFILE", "") not in ("", "0"),
+                    track_memory=os.environ.get("DRAFTSCULPTOR_PROFILE", "") == "memory")
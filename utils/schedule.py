@@ -0,0 +1,149 @@
+import os
+import threading
+from collections import OrderedDict
+from .utils import root, pjoin, render_rows
+from .atlas import get_atlas, ATLAS_CACHE_SIZE
+from .fonts import resolve_fallback_fonts
+from .glyphs import preload_glyphs, PYRAMID_CACHE_SIZE
+
+
+def glyph_dirs():
+    directory = pjoin(root(), 'assets', 'imgs')
+    return frozenset(x for x in os.listdir(directory) if os.path.isdir(pjoin(directory, x)))
+
+
+def job_resources(conf, dirs=None):
+    """
+    Glyph directories and (font path, size) pairs a config will need.
+
+    Args:
+        conf (pd.DataFrame): Config rows.
+        dirs (frozenset, optional): Glyph directory names, defaults to glyph_dirs().
+
+    Returns:
+        tuple: (frozenset of glyph directory names, frozenset of (font path, size, text) tuples).
+    """
+    dirs = glyph_dirs() if dirs is None else dirs
+    glyphs, fonts = set(), set()
+    try:
+        rows = render_rows(conf)
+    except (ValueError, KeyError):
+        return frozenset(), frozenset()
+    for text, _, _, size, font in rows:
+        if font == 'hand':
+            glyphs.update(d for d in dirs if d in text)
+            continue
+        font_path = pjoin(root(), 'assets', 'fonts', f'{font}.ttf')
+        paths = (font_path,) if font != 'default' and os.path.exists(font_path) else resolve_fallback_fonts(text)
+        fonts.update((p, size, text) for p in paths)
+    return frozenset(glyphs), frozenset(fonts)
+
+
+def _signature(resources):
+    glyphs, fonts = resources
+    return glyphs | {(p, size) for p, size, _ in fonts} | {c for _, _, text in fonts for c in text}
+
+
+def schedule_jobs(jobs, window=64):
+    """
+    Order batch jobs for cache reuse: grouped by template (in order of first appearance), and
+    within a template greedily by the overlap of glyphs, fonts/sizes and characters with the job
+    just scheduled, looking at most `window` jobs ahead.
+
+    Args:
+        jobs (list): [(key, template, conf)].
+        window (int): Candidates compared per step, bounds the cost to O(n * window).
+
+    Returns:
+        list: The same jobs, reordered.
+    """
+    groups = OrderedDict()
+    for job in jobs:
+        groups.setdefault(job[1], []).append(job)
+    dirs = glyph_dirs()
+    ordered = []
+    for group in groups.values():
+        remaining = [(job, _signature(job_resources(job[2], dirs))) for job in group]
+        current = set()
+        while remaining:
+            best = max(range(min(window, len(remaining))), key=lambda i: len(current & remaining[i][1]))
+            job, current = remaining.pop(best)
+            ordered.append(job)
+    return ordered
+
+
+def prefetch(conf, dirs=None, glyph_limit=None, atlas_limit=None):
+    """
+    Load the glyph pyramids and rasterize the TTF characters a config needs.
+
+    Args:
+        conf (pd.DataFrame): Config rows.
+        dirs (frozenset, optional): Glyph directory names, defaults to glyph_dirs().
+        glyph_limit (int, optional): Most glyph files to load, see preload_glyphs.
+        atlas_limit (int, optional): Most (font, size) atlases to fill.
+    """
+    glyphs, fonts = job_resources(conf, dirs)
+    preload_glyphs(glyphs, limit=glyph_limit)
+    atlases = set(sorted({(font_path, size) for font_path, size, _ in fonts})[:atlas_limit])
+    for font_path, size, text in sorted(fonts):
+        if (font_path, size) not in atlases:
+            continue
+        atlas = get_atlas(font_path, size)
+        for char in text:
+            atlas.glyph(char)
+
+
+class Prefetcher(object):
+    """
+    Background thread that prefetches the glyphs and font sizes of the next `lookahead` configs
+    while the current one renders.
+
+    Each prefetched config gets an equal share of the pyramid and atlas caches, with two shares left
+    for the page being rendered, so prefetching does not evict what the current page uses.
+
+    Usage:
+        prefetcher = Prefetcher([conf for _, _, conf in jobs])
+        for i, job in enumerate(jobs):
+            prefetcher.advance(i)
+            ...
+        prefetcher.close()
+    """
+    def __init__(self, confs, lookahead=4):
+        self.confs = list(confs)
+        self.lookahead = lookahead
+        self.position = 0
+        self.fetched = 0
+        shares = lookahead + 2
+        self.glyph_limit = max(1, PYRAMID_CACHE_SIZE // shares)
+        self.atlas_limit = max(1, ATLAS_CACHE_SIZE // shares)
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        dirs = glyph_dirs()
+        for i, conf in enumerate(self.confs):
+            with self._cond:
+                while not self._closed and i > self.position + self.lookahead:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            if i < self.position:
+                continue  # 已经渲染过，不再预取
+            try:
+                prefetch(conf, dirs, self.glyph_limit, self.atlas_limit)
+                self.fetched += 1
+            except Exception as e:
+                print(f"[Prefetch] 预取失败: {e}")
+
+    def advance(self, position):
+        with self._cond:
+            self.position = position
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
@@ -0,0 +1,186 @@
+import os
+import json
+import numpy as np
+from multiprocessing import shared_memory
+from PIL import Image
+from .utils import root, pjoin
+
+
+class SharedImageStore(object):
+    """
+    Decoded templates and glyphs packed into one block of shared memory.
+
+    The parent process decodes every image once as RGBA (glyphs already trimmed to their ink box)
+    and writes the index (path -> offset, size, mtime, trim box) as JSON after the pixels. Workers
+    only receive the small `handle` (block name, index offset and length), attach read-only, read
+    the index from the block and get zero-copy numpy arrays / PIL images backed by it. A worker then
+    only holds its working canvas instead of its own decoded template and glyph copies.
+
+    Usage:
+        store = SharedImageStore.create(templates=[template])
+        with ProcessPoolExecutor(initializer=attach_shared_store, initargs=(store.handle,)) as pool:
+            ...
+        store.close()
+        store.unlink()
+    """
+    def __init__(self, shm, index, index_span, owner=False):
+        self.shm = shm
+        self.index = index  # {绝对路径: (偏移, 宽, 高, mtime_ns, 裁边框)}，裁边框为 (左, 上, 原宽, 原高) 或 None
+        self.index_span = index_span  # 索引 JSON 在共享内存中的 (偏移, 长度)
+        self.owner = owner
+
+    @classmethod
+    def create(cls, templates=(), glyphs=True):
+        """
+        Args:
+            templates (iterable of str): Template images to share.
+            glyphs (bool): Also share every glyph under assets/imgs.
+
+        Returns:
+            SharedImageStore: The owning store; call unlink() when the workers are done.
+        """
+        images = []
+        for path in templates:
+            images.append((path, Image.open(path).convert("RGBA"), None))
+        if glyphs:
+            for path in glyph_files():
+                image = Image.open(path).convert("RGBA")
+                box = (0, 0) + image.size
+                bbox = image.getchannel('A').getbbox()
+                if bbox:
+                    box = bbox[:2] + image.size  # 记录裁边位置，GlyphPyramid 据此还原透明边
+                    image = image.crop(bbox)
+                images.append((path, image, box))
+        index = {}
+        offset = 0
+        for path, image, box in images:
+            index[os.path.abspath(path)] = (offset, image.width, image.height, os.stat(path).st_mtime_ns, box)
+            offset += image.width * image.height * 4
+        payload = json.dumps(index, ensure_ascii=False).encode('utf-8')
+        shm = shared_memory.SharedMemory(create=True, size=offset + len(payload))
+        for path, image, _ in images:
+            entry = index[os.path.abspath(path)]
+            view = np.ndarray((image.height, image.width, 4), dtype=np.uint8, buffer=shm.buf, offset=entry[0])
+            view[:] = np.asarray(image)
+        shm.buf[offset:offset + len(payload)] = payload
+        return cls(shm, index, (offset, len(payload)), owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        name, index_offset, index_length = handle
+        shm = shared_memory.SharedMemory(name=name)
+        raw = json.loads(bytes(shm.buf[index_offset:index_offset + index_length]).decode('utf-8'))
+        index = {path: tuple(entry[:4]) + (None if entry[4] is None else tuple(entry[4]),)
+                 for path, entry in raw.items()}
+        return cls(shm, index, (index_offset, index_length))
+
+    @property
+    def handle(self):
+        """
+        (block name, index offset, index length): all a worker needs to attach, the index itself
+        is read from the shared block instead of being pickled to every worker.
+        """
+        return (self.shm.name,) + tuple(self.index_span)
+
+    @property
+    def nbytes(self):
+        return self.shm.size
+
+    def _entry(self, path, mtime_ns=None):
+        entry = self.index.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        if mtime_ns is None:
+            mtime_ns = os.stat(path).st_mtime_ns
+        # 文件在共享之后被修改时回退到从磁盘读取
+        return entry if entry[3] == mtime_ns else None
+
+    def array(self, path, mtime_ns=None):
+        """
+        Returns:
+            np.ndarray: Read-only (h, w, 4) view of a shared image, or None if not shared.
+        """
+        entry = self._entry(path, mtime_ns)
+        if entry is None:
+            return None
+        offset, width, height = entry[:3]
+        view = np.ndarray((height, width, 4), dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+        view.flags.writeable = False
+        return view
+
+    def image(self, path, mtime_ns=None):
+        """
+        Returns:
+            PIL.Image.Image: Read-only RGBA image backed by the shared block, or None if not shared.
+        """
+        entry = self._entry(path, mtime_ns)
+        if entry is None:
+            return None
+        offset, width, height = entry[:3]
+        buffer = self.shm.buf[offset:offset + width * height * 4]
+        return Image.frombuffer("RGBA", (width, height), buffer, "raw", "RGBA", 0, 1)
+
+    def glyph(self, path, mtime_ns=None):
+        """
+        Returns:
+            tuple: (trimmed shared glyph image, (left, top, source width, source height)), or None
+                   if the file is not shared as a glyph.
+        """
+        entry = self._entry(path, mtime_ns)
+        if entry is None or entry[4] is None:
+            return None
+        return self.image(path, entry[3]), entry[4]
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # 仍有图像引用共享内存，随进程退出释放
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+
+def glyph_files(directory=None):
+    """
+    All glyph image files under assets/imgs.
+    """
+    directory = directory or pjoin(root(), 'assets', 'imgs')
+    files = []
+    for chara in sorted(os.listdir(directory)):
+        chara_dir = pjoin(directory, chara)
+        if os.path.isdir(chara_dir):
+            files += [pjoin(chara_dir, x) for x in sorted(os.listdir(chara_dir)) if x.endswith('.png')]
+    return files
+
+
+_STORE = None
+
+
+def attach_shared_store(handle):
+    """
+    Attach this process to a SharedImageStore, e.g. as a process pool initializer.
+    """
+    global _STORE
+    _STORE = SharedImageStore.attach(handle)
+    return _STORE
+
+
+def shared_image(path, mtime_ns=None):
+    """
+    The shared image of a file in the attached store, or None when nothing is attached or the
+    file is not shared.
+    """
+    if _STORE is None:
+        return None
+    return _STORE.image(path, mtime_ns)
+
+
+def shared_glyph(path, mtime_ns=None):
+    """
+    The shared trimmed glyph and its trim box, see SharedImageStore.glyph.
+    """
+    if _STORE is None:
+        return None
+    return _STORE.glyph(path, mtime_ns)
@@ -0,0 +1,251 @@
+import io
+import os
+import json
+import tarfile
+import zipfile
+from datetime import datetime
+from PIL import TiffImagePlugin
+from .io import output_format, flatten_image, save_image
+
+
+MANIFEST_NAME = "manifest.json"
+
+
+class OutputSink(object):
+    """
+    Streams rendered pages into a single output file as they are produced.
+
+    Pages are encoded and written one at a time and never kept after write() returns, so memory
+    stays bounded by one page whatever the batch size. manifest maps config names to entries and
+    is written when the sink is closed.
+
+    Usage:
+        with open_sink("out.zip", fmt="png-fast") as sink:
+            sink.write("0001", image)
+    """
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.fmt = output_format(fmt)
+        self.manifest = []
+        self._names = set()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _entry_name(self, name):
+        # 不同配置文件可能同名，重名时追加序号
+        entry, k = f"{name}{self.fmt.ext}", 1
+        while entry in self._names:
+            entry = f"{name}_{k}{self.fmt.ext}"
+            k += 1
+        self._names.add(entry)
+        return entry
+
+    def write(self, name, image):
+        """
+        Append one page.
+
+        Args:
+            name (str): Config name, recorded in the manifest.
+            image (PIL.Image.Image): The rendered page.
+
+        Returns:
+            dict: The manifest record of the page.
+        """
+        raise NotImplementedError
+
+    def manifest_data(self):
+        return {"output": os.path.basename(self.path), "format": self.fmt.format,
+                "created": datetime.now().isoformat(timespec='seconds'), "pages": self.manifest}
+
+    def manifest_bytes(self):
+        return json.dumps(self.manifest_data(), ensure_ascii=False, indent=2).encode('utf-8')
+
+    def write_manifest(self):
+        # 多页文件无法内嵌清单，写在旁边：<输出>.manifest.json
+        with open(f"{self.path}.{MANIFEST_NAME}", 'wb') as f:
+            f.write(self.manifest_bytes())
+
+    def close(self):
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ZipSink(OutputSink):
+    """
+    Pages as entries of a zip archive, stored without recompression since PNG/JPEG/WebP are
+    already compressed. The manifest is stored as manifest.json inside the archive.
+    """
+    def __init__(self, path, fmt=None):
+        super().__init__(path, fmt)
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+
+    def write(self, name, image):
+        entry = self._entry_name(name)
+        with self._zip.open(entry, 'w', force_zip64=True) as f:
+            save_image(image, f, self.fmt)
+        record = {"name": name, "entry": entry, "bytes": self._zip.getinfo(entry).file_size}
+        self.manifest.append(record)
+        return record
+
+    def close(self):
+        if self._zip.fp is None:
+            return
+        self._zip.writestr(MANIFEST_NAME, self.manifest_bytes())
+        self._zip.close()
+
+
+class TarSink(OutputSink):
+    """
+    Pages as members of a tar archive (.tar, or gzip-compressed .tar.gz/.tgz), with manifest.json
+    as the last member.
+    """
+    def __init__(self, path, fmt=None):
+        super().__init__(path, fmt)
+        mode = 'w:gz' if path.lower().endswith(('.tar.gz', '.tgz')) else 'w'
+        self._tar = tarfile.open(path, mode)
+
+    def _add(self, entry, data):
+        info = tarfile.TarInfo(entry)
+        info.size = len(data)
+        info.mtime = int(datetime.now().timestamp())
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def write(self, name, image):
+        entry = self._entry_name(name)
+        buffer = io.BytesIO()
+        save_image(image, buffer, self.fmt)
+        self._add(entry, buffer.getvalue())
+        record = {"name": name, "entry": entry, "bytes": buffer.tell()}
+        self.manifest.append(record)
+        return record
+
+    def close(self):
+        if self._tar.closed:
+            return
+        self._add(MANIFEST_NAME, self.manifest_bytes())
+        self._tar.close()
+
+
+class TiffSink(OutputSink):
+    """
+    Pages appended as frames of one multi-page TIFF, deflate-compressed and flattened to RGB by
+    default. The file stays open and every page is appended in place.
+    """
+    def __init__(self, path, mode='RGB', compression='tiff_deflate', dpi=None):
+        super().__init__(path)
+        self.mode = mode
+        self.params = {'compression': compression}
+        if dpi:
+            self.params['dpi'] = (dpi, dpi)
+        self._fp = open(path, 'w+b')
+        self._tiff = TiffImagePlugin.AppendingTiffWriter(self._fp)
+
+    def write(self, name, image):
+        flatten_image(image, self.mode).save(self._tiff, format='TIFF', **self.params)
+        self._tiff.newFrame()
+        record = {"name": name, "page": len(self.manifest)}
+        self.manifest.append(record)
+        return record
+
+    def close(self):
+        if self._fp.closed:
+            return
+        self._tiff.close()
+        self._fp.close()
+        self.write_manifest()
+
+
+class PdfSink(OutputSink):
+    """
+    Pages streamed into one PDF, embedded as JPEG (RGB) or grayscale JPEG images at the given
+    resolution. Every page is written once as its image, content and page objects; the page tree,
+    xref table and trailer follow at close(), so appending a page costs the same at any length.
+    """
+    COLOR_SPACES = {'RGB': b'/DeviceRGB', 'L': b'/DeviceGray'}
+
+    def __init__(self, path, mode='RGB', resolution=300.0):
+        super().__init__(path)
+        if mode not in self.COLOR_SPACES:
+            raise ValueError(f"Unsupported PDF page mode: {mode}")
+        self.mode = mode
+        self.resolution = resolution
+        self._offsets = [None, None]  # 对象 1、2 为目录与页面树，关闭时写出
+        self._kids = []
+        self._fp = open(path, 'wb')
+        self._fp.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _new_object(self):
+        self._offsets.append(None)
+        return len(self._offsets)
+
+    def _write_object(self, num, body, stream=None):
+        self._offsets[num - 1] = self._fp.tell()
+        self._fp.write(b"%d 0 obj\n" % num + body)
+        if stream is not None:
+            self._fp.write(b"\nstream\n" + stream + b"\nendstream")
+        self._fp.write(b"\nendobj\n")
+
+    def write(self, name, image):
+        page = flatten_image(image, self.mode)
+        buffer = io.BytesIO()
+        page.save(buffer, format='JPEG')
+        data = buffer.getvalue()
+        width, height = (x * 72.0 / self.resolution for x in page.size)
+        image_ref, content_ref, page_ref = self._new_object(), self._new_object(), self._new_object()
+        self._write_object(image_ref, b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s "
+                           b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>"
+                           % (page.width, page.height, self.COLOR_SPACES[self.mode], len(data)), data)
+        content = b"q %.4f 0 0 %.4f 0 0 cm /Im0 Do Q" % (width, height)
+        self._write_object(content_ref, b"<< /Length %d >>" % len(content), content)
+        self._write_object(page_ref, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.4f %.4f] "
+                           b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+                           % (width, height, image_ref, content_ref))
+        self._kids.append(page_ref)
+        record = {"name": name, "page": len(self.manifest)}
+        self.manifest.append(record)
+        return record
+
+    def close(self):
+        if self._fp.closed:
+            return
+        kids = b" ".join(b"%d 0 R" % ref for ref in self._kids)
+        self._write_object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._kids)))
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        start = self._fp.tell()
+        size = len(self._offsets) + 1
+        self._fp.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        self._fp.write(b"".join(b"%010d 00000 n \n" % offset for offset in self._offsets))
+        self._fp.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, start))
+        self._fp.close()
+        self.write_manifest()
+
+
+SINKS = {'.zip': ZipSink, '.tar': TarSink, '.tgz': TarSink, '.gz': TarSink,
+         '.tif': TiffSink, '.tiff': TiffSink, '.pdf': PdfSink}
+
+
+def open_sink(path, fmt=None):
+    """
+    Open the sink for an output path by its extension.
+
+    Args:
+        path (str): .zip, .tar, .tar.gz/.tgz, .tif/.tiff or .pdf.
+        fmt (str | OutputFormat, optional): Page format inside zip/tar archives, see OUTPUT_FORMATS.
+
+    Returns:
+        OutputSink: The opened sink.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SINKS or (ext == '.gz' and not path.lower().endswith('.tar.gz')):
+        raise ValueError(f"Unsupported output file: {path}")
+    sink = SINKS[ext]
+    if sink in (ZipSink, TarSink):
+        return sink(path, fmt)
+    return sink(path)
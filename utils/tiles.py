@@ -0,0 +1,200 @@
+import os
+import zlib
+import struct
+import random
+import numpy as np
+from functools import lru_cache
+from PIL import Image
+from .io import output_format, flatten_image, atomic_output
+from .augmentation import Augmentation
+from .profiling import profiler
+from .shared import shared_image
+
+
+TILE_HEIGHT = 512  # 每条带的行数，单条带的内存约为 宽 x TILE_HEIGHT x 4 字节
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_COLOR_TYPES = {'L': (0, 1), 'RGB': (2, 3), 'RGBA': (6, 4)}
+
+
+class PngStreamWriter(object):
+    """
+    Minimal streaming PNG encoder: rows are filtered and deflated as they arrive, so the whole
+    image never has to exist in memory.
+
+    Rows are written with filter None (0) or Up (2). On the scanned templates under
+    assets/templates, None deflates smaller than Pillow's adaptive filtering at no filtering cost;
+    Up suits smoother images and is a single numpy subtraction per strip.
+
+    Usage:
+        with PngStreamWriter(f, width, height, 'RGBA') as png:
+            png.write_rows(strip_array)
+    """
+    def __init__(self, fp, width, height, mode='RGBA', compress_level=6, png_filter=0):
+        if mode not in _PNG_COLOR_TYPES:
+            raise ValueError(f"Unsupported PNG mode: {mode}")
+        if png_filter not in (0, 2):
+            raise ValueError(f"Unsupported PNG filter: {png_filter}")
+        self.fp = fp
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.color_type, self.channels = _PNG_COLOR_TYPES[mode]
+        self.rows = 0
+        self.png_filter = png_filter
+        self._previous = np.zeros(width * self.channels, dtype=np.uint8)  # 上一行，用于 Up 滤波
+        self._compressor = zlib.compressobj(compress_level)
+        self.fp.write(_PNG_SIGNATURE)
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, self.color_type, 0, 0, 0))
+
+    def _chunk(self, tag, data):
+        self.fp.write(struct.pack('>I', len(data)) + tag + data)
+        self.fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows):
+        """
+        Args:
+            rows (np.ndarray): uint8 array of shape (n, width, channels) or (n, width) for 'L'.
+        """
+        rows = np.asarray(rows, dtype=np.uint8).reshape(len(rows), self.width * self.channels)
+        if self.rows + len(rows) > self.height:
+            raise ValueError("More rows written than the PNG height.")
+        filtered = np.empty((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = self.png_filter
+        if self.png_filter == 2:
+            np.subtract(rows[0], self._previous, out=filtered[0, 1:])
+            np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+            self._previous = rows[-1].copy()
+        else:
+            filtered[:, 1:] = rows
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b'IDAT', data)
+        self.rows += len(rows)
+
+    def close(self):
+        if self._compressor is None:
+            return
+        if self.rows != self.height:
+            raise ValueError(f"PNG expects {self.height} rows, got {self.rows}.")
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+        self._compressor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+
+@lru_cache(maxsize=2)
+def _load_template(path, mtime_ns):
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+def load_template(imgp):
+    """
+    Decode a template once per process and keep it in its stored mode (no RGBA copy), or use
+    the shared-memory copy when the process is attached to a SharedImageStore.
+
+    Args:
+        imgp (str | PIL.Image.Image): Template path or an already decoded template.
+    """
+    if isinstance(imgp, Image.Image):
+        return imgp
+    mtime_ns = os.stat(imgp).st_mtime_ns
+    image = shared_image(imgp, mtime_ns)
+    if image is not None:
+        return image
+    with profiler.stage("decode"):
+        return _load_template(imgp, mtime_ns)
+
+
+def assign_tiles(placed, height, tile_height):
+    """
+    Assign placed layers to the horizontal strips they intersect, keeping the plan order.
+
+    Args:
+        placed (list): [(layer, x, y)].
+        height (int): Page height.
+        tile_height (int): Strip height.
+
+    Returns:
+        list: One list of (layer, x, y) per strip.
+    """
+    tiles = [[] for _ in range((height + tile_height - 1) // tile_height)]
+    for layer, x, y in placed:
+        first = max(y, 0) // tile_height
+        last = min(y + layer.height - 1, height - 1) // tile_height
+        for k in range(first, last + 1):
+            tiles[k].append((layer, x, y))
+    return tiles
+
+
+def render_tiled(imgp, plan, output, rng=None, tile_height=None, fmt=None, augment=False):
+    """
+    Render a plan strip by strip and stream the strips into a PNG.
+
+    The text layers are rendered first (they are small), assigned to the strips they intersect and
+    composited onto one RGBA strip at a time, which is encoded before the next strip is cut, so the
+    working memory is one strip instead of RGBA copies of the page. The output is pixel-identical
+    to render_plan. The template itself is still decoded in full once per process, since PIL cannot
+    decode part of a PNG.
+
+    Args:
+        imgp (str | PIL.Image.Image): Template path, or an already decoded template.
+        plan (RenderPlan): Plan produced by compile_plan.
+        output (str | file): Output path or binary file object.
+        rng (random.Random, optional): Random source for this render.
+        tile_height (int, optional): Strip height, defaults to TILE_HEIGHT.
+        fmt (str | OutputFormat, optional): A PNG output format, see utils.io.OUTPUT_FORMATS.
+        augment (bool): Apply ink spread/break augmentation to every layer.
+    """
+    from .write import render_layer  # write 在 draw 中使用本模块，此处延迟导入
+    rng = random if rng is None else rng
+    tile_height = tile_height or TILE_HEIGHT
+    fmt = output_format(fmt, output if isinstance(output, str) else None)
+    if fmt.format != 'PNG':
+        raise ValueError("Tiled rendering only writes PNG.")
+    template = load_template(imgp)
+    width, height = template.size
+
+    placed = []
+    for item in plan.items:
+        layer = render_layer(item, rng)
+        if augment:
+            with profiler.stage("augment"):
+                layer = Augmentation(layer, rng=rng).run()
+        layer = layer.convert("RGBA")
+        if item.x + layer.width > width or item.y + layer.height > height:
+            raise ValueError("PNG image exceeds the background dimensions at the specified position.")
+        placed.append((layer, item.x, item.y))
+    tiles = assign_tiles(placed, height, tile_height)
+
+    mode = fmt.mode or 'RGBA'
+    if isinstance(output, str):
+        with atomic_output(output) as tmp, open(tmp, 'wb') as fp:
+            _write_strips(fp, template, tiles, tile_height, mode, fmt)
+    else:
+        _write_strips(output, template, tiles, tile_height, mode, fmt)
+    return output
+
+
+def _write_strips(fp, template, tiles, tile_height, mode, fmt):
+    width, height = template.size
+    with PngStreamWriter(fp, width, height, mode, fmt.params.get('compress_level', 6)) as png:
+        for k, layers in enumerate(tiles):
+            top = k * tile_height
+            bottom = min(top + tile_height, height)
+            with profiler.stage("decode"):
+                strip = template.crop((0, top, width, bottom)).convert("RGBA")
+            with profiler.stage("composite"):
+                for layer, x, y in layers:
+                    strip.paste(layer, (x, y - top), layer)
+            with profiler.stage("save"):
+                png.write_rows(np.asarray(flatten_image(strip, mode)))
@@ -1,8 +1,10 @@
 import os
+import zlib
 import pandas as pd
 from PIL import Image
 import numpy as np
 import cv2
+from .io import read_config
 
 def root():
     starting_path = os.path.dirname(os.path.abspath(__file__))
@@ -16,39 +18,74 @@ def pjoin(*x):
     return os.path.join(*x)
 
 def check_format(df_):
-    if os.path.exists(df_):
-        file_name = df_
-        if file_name.endswith('.xlsx'):
-            df = pd.read_excel(file_name)
-        elif file_name.endswith('.csv'):
-            df = pd.read_csv(file_name)
-        else:
+    if isinstance(df_, str) and os.path.exists(df_):
+        try:
+            df = read_config(df_)
+        except ValueError:
             print("Unsupported file format.")
             return
+        except ImportError as e:  # Parquet/Feather 需要 pyarrow
+            print(f"Unsupported file format, missing dependency: {e}")
+            return
     else:
         df = df_
     required_columns = {"文字", "X", "Y", "大小", "字体"}
     if not required_columns.issubset(df.columns):
         print("File does not contain the required columns.")
         return
-    for i, row in df.iterrows():
-        if not isinstance(row["文字"], (str, pd._libs.missing.NAType)):
-            # print(f"Row {i+1}: '文字' should be a string or a file path.")
-            row["文字"] = str(row["文字"])
-        if not isinstance(row["X"], (int, float)):
-            print(f"Row {i+1}: 'X' should be a number.")
-            return
-        if not isinstance(row["Y"], (int, float)):
-            print(f"Row {i+1}: 'Y' should be a number.")
-            return
-        if not isinstance(row["大小"], (int, float)):
-            print(f"Row {i+1}: '大小' should be a number.")
-            return
-        if not isinstance(row["字体"], str):
-            print(f"Row {i+1}: '字体' should be a string.")
-            return
+    df, errors = validate_config(df)
+    if errors:
+        for error in errors:
+            print(error)
+        return
     return df
 
+def validate_config(df):
+    """
+    Coerce the five render columns to typed arrays in one vectorized pass.
+
+    Args:
+        df (pd.DataFrame): Config with 文字/X/Y/大小/字体 columns.
+
+    Returns:
+        tuple: (coerced copy of df, list of error messages for every bad row).
+    """
+    df = df.copy()
+    errors = []
+    text = df["文字"].astype(object)
+    df["文字"] = text.where(text.isna(), text.astype(str))  # 数字等转为字符串，空值保留
+    bad = {}
+    for col in ["X", "Y", "大小"]:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+        bad[col] = df[col].isna().to_numpy()
+    font = df["字体"].astype(object)
+    bad["字体"] = font.isna().to_numpy()
+    df["字体"] = font.where(font.isna(), font.astype(str))
+    messages = {"X": "'X' should be a number.", "Y": "'Y' should be a number.",
+                "大小": "'大小' should be a number.", "字体": "'字体' should be a string."}
+    for i in np.flatnonzero(np.logical_or.reduce(list(bad.values()))):
+        for col, mask in bad.items():
+            if mask[i]:
+                errors.append(f"Row {i+1}: {messages[col]}")
+    return df, errors
+
+def render_rows(conf):
+    """
+    Compact typed render plan: a list of (text, x, y, size, font) tuples with int coordinates.
+
+    Raises:
+        ValueError: If any row cannot be coerced, listing all bad rows.
+    """
+    df, errors = validate_config(conf)
+    if errors:
+        raise ValueError("\n".join(errors))
+    texts = df["文字"].astype(str).tolist()
+    xs = np.trunc(df["X"].to_numpy(dtype=float)).astype(np.int64).tolist()
+    ys = np.trunc(df["Y"].to_numpy(dtype=float)).astype(np.int64).tolist()
+    sizes = np.trunc(df["大小"].to_numpy(dtype=float)).astype(np.int64).tolist()
+    fonts = df["字体"].tolist()
+    return list(zip(texts, xs, ys, sizes, fonts))
+
 def add_white_background(pil_img) -> np.ndarray:
     """
     Add a white background to a transparent PNG image and return the image in OpenCV format.
@@ -135,6 +172,21 @@ def write_log(file_path, content):
     with open(file_path, 'a') as file:
         file.write(content + '\n')
 
+def sparse_disturb(x):
+    """
+    Parse a disturbance setting into (x, y, size) amplitudes: 10 -> (10, 10, 10), "20 10 5" -> [20, 10, 5].
+    """
+    if isinstance(x, (int, float)):  # "扰动": 10
+        return x, x, x
+    else:  # "扰动": 10 20 5
+        return [int(y) for y in x.split(" ")]
+
+def document_seed(name, base=0):
+    """
+    Derive a stable per-document seed from a document name, so reruns of a batch are reproducible.
+    """
+    return zlib.crc32(f"{base}:{name}".encode('utf-8'))
+
     
 
 if __name__ == "__main__":
@@ -1,29 +1,43 @@
 import os
 import random
+import shutil
 import numpy as np
 import pandas as pd
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import cv2
-from utils import root, pjoin, can_substitude, find_substitude
-from collections import Counter
+from utils import root, pjoin, can_substitude, find_substitude, render_rows, sparse_disturb
+from collections import Counter, OrderedDict, namedtuple
+from functools import lru_cache
 from .augmentation import Augmentation
+from .cache import handwrite_pool, text_layer_cache
+from .atlas import get_atlas
+from .fonts import resolve_fallback_fonts
+from . import glyphs as glyph_store
+from .profiling import profiler
+from .io import save_image, output_format, atomic_output
+from .tiles import render_tiled
+from .shared import shared_image
 
 
-def find_ttf_file(font_name=None, exception=None):
+def find_ttf_file(font_name=None, exception=None, rng=None):
     """
     Finds the path to a TTF file in the specified directory.
     
     Args:
         font_name (str, optional): The name of the TTF file to search for (without the .ttf extension).
                                    If None or not found, a random TTF file from the directory will be returned.
+        exception (list, optional): TTF file names that must not be returned.
+        rng (random.Random, optional): Random source for the fallback choice, defaults to the global `random`.
     
     Returns:
         str: The path to the found TTF file, or a random one if the specific file is not found.
     """
+    rng = random if rng is None else rng
     # Get all .ttf files in the directory
     directory = pjoin(root(), 'assets', 'fonts')
     
-    ttf_files = [f for f in os.listdir(directory) if f.endswith('.ttf')]
+    # 排序后再随机选择，同一种子在不同文件系统上选中同一字体
+    ttf_files = sorted(f for f in os.listdir(directory) if f.endswith('.ttf'))
     if exception:
         ttf_files = [x for x in ttf_files if x not in exception]
     
@@ -38,10 +52,10 @@ def find_ttf_file(font_name=None, exception=None):
                 if os.path.exists(cand_ttf):
                     return cand_ttf
                 else:
-                    return os.path.join(directory, random.choice(ttf_files))
+                    return os.path.join(directory, rng.choice(ttf_files))
     
     # If not found or font_name is None, return a random TTF file
-    return os.path.join(directory, random.choice(ttf_files))
+    return os.path.join(directory, rng.choice(ttf_files))
 
 def find_all_combinations(path: str, text: str):
     """
@@ -93,10 +107,10 @@ def get_chara_dict(comb):
     directory = pjoin(root(), 'assets', 'imgs')
     chara_dict = {}
     for chara in comb:
-        chara[chara] = [x.split('.')[0] for x in os.listdir(pjoin(directory))]
+        chara[chara] = [x.split('.')[0] for x in sorted(os.listdir(pjoin(directory)))]
     return chara_dict
 
-def find_solution(chara_dict):
+def find_solution(chara_dict, rng=None):
     """
     example_dict = {
     "A": ['a', 'b', 'c'],
@@ -105,26 +119,28 @@ def find_solution(chara_dict):
     }
     result = find_solution(example_dict)
     """
+    rng = random if rng is None else rng
     combined_list = [item for sublist in chara_dict.values() for item in sublist]
     freq = Counter(combined_list)
     max_frequency = max(freq.values())
     max_frequency_items = [item for item, count in freq.items() if count == max_frequency]
-    solution = random.choice(max_frequency_items)
+    solution = rng.choice(max_frequency_items)
     result = {}
     for k,v in chara_dict.items():
         if solution in v:
             result[k] = solution
         else:
-            result[k] = random.choice(v)
+            result[k] = rng.choice(v)
     return result
 
-def concat_images_horizontally(image_paths, target_height):
+def concat_images_horizontally(image_paths, target_height, resample=None):
     """
     Concatenate multiple PNG images horizontally and resize them to the specified height.
     
     Args:
-    image_paths (list of str): List of file paths for the PNG images.
+    image_paths (list of str or PIL.Image): File paths of the PNG images, or already rendered images.
     target_height (int): The desired height for the output image.
+    resample (str, optional): 'quality' or 'fast', defaults to the module setting in utils.glyphs.
     
     Returns:
     Image object: The concatenated image.
@@ -141,12 +157,17 @@ def concat_images_horizontally(image_paths, target_height):
     
     # Resize images to the specified height and append them to the list
     for image_path in image_paths:
-        img = Image.open(image_path).convert("RGBA")
+        if isinstance(image_path, Image.Image):
+            img = image_path.convert("RGBA")
 
-        # Calculate the new width to maintain aspect ratio
-        aspect_ratio = img.width / img.height
-        new_width = int(aspect_ratio * target_height)
-        resized_img = img.resize((new_width, target_height))
+            # Calculate the new width to maintain aspect ratio
+            aspect_ratio = img.width / img.height
+            new_width = int(aspect_ratio * target_height)
+            with profiler.stage("resize"):
+                resized_img = img.resize((new_width, target_height), glyph_store.RESAMPLE[resample or glyph_store.RESAMPLE_MODE])
+        else:
+            # 字形文件经裁边后的金字塔，从最近的较大层级缩放
+            resized_img = glyph_store.load_glyph(image_path, target_height, resample)
         # if random.uniform(0,1) > 0.0:  # 图像增强（已关闭）
         #     _, _, _, a = resized_img.split()
         #     alpha_blurred = a.filter(ImageFilter.MaxFilter(3))
@@ -178,52 +199,145 @@ def concat_images_horizontally(image_paths, target_height):
     
     # Paste images one by one from left to right
     current_x = 0
-    for img in images:
-        concatenated_image.paste(img, (current_x, 0), img)
-        current_x += img.width
+    with profiler.stage("composite"):
+        for img in images:
+            concatenated_image.paste(img, (current_x, 0), img)
+            current_x += img.width
     
     return concatenated_image
 
-def use_handswrite(text, font_height: int) -> Image:
+def list_glyph_names(chara):
+    """
+    List the variant names (file stems) available for one glyph directory.
+    """
+    directory = pjoin(root(), 'assets', 'imgs')
+    with profiler.stage("lookup"):
+        # os.listdir 的顺序取决于文件系统，排序后同一种子在不同机器上选中同一字形
+        return [x.split('.')[0] for x in sorted(os.listdir(pjoin(directory, chara))) if x.endswith('.png')]
+
+def resolve_handwrite(text):
+    """
+    Resolve the segmentation and glyph variants of a text once, so it can be composed many times.
+
+    Args:
+        text (str): The target text.
+
+    Returns:
+        list: One entry per combination, each a tuple of (chara, tuple of variant names).
+              Empty when the text cannot be formed from the glyph library.
+    """
+    directory = pjoin(root(), 'assets', 'imgs')
+    names = {}
+    resolved = []
+    with profiler.stage("segment"):
+        combinations = find_all_combinations(directory, text)
+    for combination in combinations:
+        for chara in combination:
+            if chara not in names:
+                names[chara] = tuple(list_glyph_names(chara))
+        resolved.append(tuple((chara, names[chara]) for chara in combination))
+    return resolved
+
+def compose_handwrite(resolved, font_height: int, rng=None) -> Image:
+    """
+    Compose a handwritten image from the output of resolve_handwrite.
+
+    Args:
+        resolved (list): Non-empty result of resolve_handwrite.
+        font_height (int): The desired height for resizing the image.
+        rng (random.Random, optional): Random source for combination and glyph choice.
+
+    Returns:
+        Image: A PIL Image object of the resized image.
+    """
+    rng = random if rng is None else rng
+    directory = pjoin(root(), 'assets', 'imgs')
+    combination = rng.choice(resolved)
+    # print(f"Combination is {combination}.")
+    solution_dict = {}
+    for chara, chara_names in combination:
+        solution_dict[chara] = list(chara_names)
+    solution = find_solution(solution_dict, rng=rng)
+    # print(f"Solution is {solution}.")
+    solution_list = []
+    for char, img_name in solution.items():
+        char_path = pjoin(directory, char, f"{img_name}.png")
+        solution_list.append(char_path)
+    return concat_images_horizontally(solution_list, font_height)
+
+def use_handswrite(text, font_height: int, rng=None) -> Image:
     """
     Finds images for a target text. If the entire text exists as a directory, selects an image from it. 
     If not, splits the text into characters and combines images from corresponding directories by 
     prioritizing matching filenames. The final image is resized to match the specified font height.
     
     Args:
-        path (str): The directory where images are stored.
         text (str): The target text to search for.
         font_height (int): The desired height for resizing the image.
+        rng (random.Random, optional): Random source for combination and glyph choice.
 
     Returns:
         Image: A PIL Image object of the resized image.
     """
+    rng = random if rng is None else rng
+    resolved = resolve_handwrite(text)
+    if resolved != []:
+        return compose_handwrite(resolved, font_height, rng=rng)
+    segments = split_handwrite(text)
+    if any(kind == 'hand' for kind, _ in segments):
+        return compose_segments(segments, font_height, rng=rng)
+    font_p = rng.choice(resolve_fallback_fonts(text, exception=["宋体.ttf"]))
+    print(f"[Warning] 无法找到 {text} 的手写体, 用字体代替.")
+    return text_to_png(text, font_height, font_p)
+    # return Image.new('RGBA', (font_height, font_height), (255, 255, 255, 0))
+
+def split_handwrite(text):
+    """
+    Split a text into runs that the glyph library can form and runs that need a TTF, so a single
+    missing character does not force the whole string to a font.
+
+    Returns:
+        tuple: Segments ('hand', resolved) or ('ttf', (run text, candidate font paths)).
+    """
     directory = pjoin(root(), 'assets', 'imgs')
+    runs = []
+    for char in text:
+        with profiler.stage("segment"):
+            kind = 'hand' if find_all_combinations(directory, char) else 'ttf'
+        if runs and runs[-1][0] == kind:
+            runs[-1][1] += char
+        else:
+            runs.append([kind, char])
+    segments = []
+    for kind, run in runs:
+        if kind == 'hand':
+            segments.append(('hand', tuple(resolve_handwrite(run))))
+        else:
+            segments.append(('ttf', (run, resolve_fallback_fonts(run, exception=["宋体.ttf"]))))
+    return tuple(segments)
 
-    combinations = find_all_combinations(directory, text)
-    if combinations == []:
-        font_p = find_ttf_file(exception=["宋体.ttf"])
-        print(f"[Warning] 无法找到 {text} 的手写体, 用字体代替.")
-        return text_to_png(text, font_height, font_p)
-        # return Image.new('RGBA', (font_height, font_height), (255, 255, 255, 0))
-    else:
-        combination = random.choice(combinations)
-        # print(f"Combination is {combination}.")
-        solution_dict = {}
-        for chara in combination:
-            chara_imgs = os.listdir(pjoin(directory, chara))
-            chara_names = [x.split('.')[0] for x in chara_imgs if x.endswith('.png')]
-            solution_dict[chara] = chara_names
-        solution = find_solution(solution_dict)
-        # print(f"Solution is {solution}.")
-        solution_list = []
-        for char, img_name in solution.items():
-            char_path = pjoin(directory, char, f"{img_name}.png")
-            solution_list.append(char_path)
-        img = concat_images_horizontally(solution_list, font_height)
-        return img
-
-def text_to_png(text, font_size, font_path=None, output_path=None):
+def compose_segments(segments, font_height: int, rng=None) -> Image:
+    """
+    Compose the output of split_handwrite: handwriting where available, covering fonts elsewhere.
+    """
+    rng = random if rng is None else rng
+    layers = []
+    for kind, value in segments:
+        if kind == 'hand':
+            layers.append(compose_handwrite(value, font_height, rng=rng))
+        else:
+            run, font_paths = value
+            layers.append(text_to_png(run, font_height, rng.choice(font_paths)))
+    return concat_images_horizontally(layers, font_height)
+
+@lru_cache(maxsize=64)
+def load_font(font_path, font_size):
+    """
+    Load a TTF font once per (path, size); FreeType faces are reused across renders.
+    """
+    return ImageFont.truetype(font_path, font_size)
+
+def text_to_png(text, font_size, font_path=None, output_path=None, rng=None, atlas=True):
     """
     Generates a PNG image of the specified text using a specified TTF font.
 
@@ -232,21 +346,27 @@ def text_to_png(text, font_size, font_path=None, output_path=None):
         font_path (str): The path to the TTF font file.
         font_size (int): The size of the font to use.
         output_path (str): The path where the PNG file will be saved, if None will return png.
+        rng (random.Random, optional): Random source used when no font_path is given.
+        atlas (bool): Compose from the per-character glyph atlas instead of rasterizing the whole string.
     """
     if not font_path:
-        font_path = find_ttf_file()
-    font = ImageFont.truetype(font_path, font_size)
-    
-    text_bbox = font.getbbox(text)
-    text_width, text_height = text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1]
+        font_path = find_ttf_file(rng=rng)
     padding = int(font_size * 0.2)  # 保证不会缺失
-    text_height += padding
-   
-    # Create a new image with a white background
-    image = Image.new('RGBA', (text_width, text_height), (255, 255, 255, 0))
-    draw = ImageDraw.Draw(image)
-    
-    draw.text((0, 0), text, font=font, fill=(0, 0, 0, 255))
+    with profiler.stage("rasterize"):
+        if atlas:
+            image = get_atlas(font_path, font_size).render(text, padding=padding)
+        else:
+            font = load_font(font_path, font_size)
+        
+            text_bbox = font.getbbox(text)
+            text_width, text_height = text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1]
+            text_height += padding
+       
+            # Create a new image with a white background
+            image = Image.new('RGBA', (text_width, text_height), (255, 255, 255, 0))
+            draw = ImageDraw.Draw(image)
+        
+            draw.text((0, 0), text, font=font, fill=(0, 0, 0, 255))
     if output_path:
         image.save(output_path)
         return
@@ -289,38 +409,283 @@ def overlay_png_on_background(background, png_image, position=(0, 0)):
     
     return combined_image
 
-def draw(imgp, conf, output_path="./output_img.png"):
-    image = Image.open(imgp)
-    for _, row in conf.iterrows():
-        text = str(row['文字'])
-        x = int(float(row['X']))
-        y = int(float(row['Y']))
-        size = int(row['大小'])
-        font = row['字体']
+def paste_layer(canvas, layer, position=(0, 0)):
+    """
+    Paste a transparent layer onto an RGBA canvas in place, with the same bounds check as
+    overlay_png_on_background but without copying the page for every layer.
+    """
+    layer = layer.convert("RGBA")
+    x, y = position
+    if x + layer.width > canvas.width or y + layer.height > canvas.height:
+        raise ValueError("PNG image exceeds the background dimensions at the specified position.")
+    canvas.paste(layer, (x, y), layer)
+    return canvas
+
+# 编译后的单行渲染记录。kind 为 'hand'、'mixed'（手写与字体混排）或 'ttf'；
+# glyphs 为 resolve_handwrite / split_handwrite 的结果，font_paths 为可选字体（多于一个时渲染时随机选择）。
+RenderItem = namedtuple('RenderItem', ['text', 'x', 'y', 'size', 'font', 'kind', 'glyphs', 'font_paths'])
+
+class RenderPlan(namedtuple('RenderPlan', ['items'])):
+    """
+    Immutable, pre-resolved render plan of one config.
+
+    Segmentation, glyph variants and font paths are resolved once by compile_plan; rendering the
+    plan only makes the random choices. Plans are small tuples and pickle cheaply to workers.
+    """
+    __slots__ = ()
+
+    def rows(self):
+        return [(item.text, item.x, item.y, item.size, item.font) for item in self.items]
+
+PLAN_CACHE_SIZE = 128
+_PLAN_CACHE = OrderedDict()
+
+def compile_plan(conf):
+    """
+    Compile a config into a RenderPlan, reusing the plan of identical configs.
+
+    Args:
+        conf (pd.DataFrame | RenderPlan): Config rows with 文字/X/Y/大小/字体 columns.
+
+    Returns:
+        RenderPlan: The compiled plan.
+    """
+    if isinstance(conf, RenderPlan):
+        return conf
+    with profiler.stage("parse"):
+        rows = tuple(render_rows(conf))
+    plan = _PLAN_CACHE.get(rows)
+    if plan is not None:
+        _PLAN_CACHE.move_to_end(rows)
+        return plan
+    items = []
+    resolved = {}
+    for text, x, y, size, font in rows:
         if font == 'hand':
-            text_img = use_handswrite(text, font_height=size)
-            # image.paste(text_img, (x, y))
-            image = overlay_png_on_background(image, text_img, (x, y))
+            if text not in resolved:
+                resolved[text] = tuple(resolve_handwrite(text))
+            glyphs = resolved[text]
+            if glyphs:
+                items.append(RenderItem(text, x, y, size, font, 'hand', glyphs, ()))
+                continue
+            segments = split_handwrite(text)
+            if any(kind == 'hand' for kind, _ in segments):
+                items.append(RenderItem(text, x, y, size, font, 'mixed', segments, ()))
+            else:
+                font_paths = resolve_fallback_fonts(text, exception=["宋体.ttf"])
+                items.append(RenderItem(text, x, y, size, font, 'hand', (), font_paths))
         elif font == 'default':
-            font_path = find_ttf_file()
-            text_png = text_to_png(text, size, font_path)
-            # aug = Augmentation(text_png)  # 去除图像增强
-            # text_png_aug = aug.run()
-            image = overlay_png_on_background(image, text_png, (x, y))
+            items.append(RenderItem(text, x, y, size, font, 'ttf', (), resolve_fallback_fonts(text)))
         else:
             font_path = pjoin(root(), 'assets', 'fonts', f'{font}.ttf')
             if not os.path.exists(font_path):
                 print(f"[Waring] 未找到 {font_path}， 随机选择一个字体替代。")
-                font_path = find_ttf_file()
-            text_png = text_to_png(text, size, font_path)
-            # aug = Augmentation(text_png)
-            # text_png_aug = aug.run()
-            image = overlay_png_on_background(image, text_png, (x, y))  # TODO: 强化图像增强
-    if output_path:    
-        image.save(output_path)
-        return True
-    else:
-        return image
+                font_paths = resolve_fallback_fonts(text)
+            else:
+                font_paths = (font_path,)
+            items.append(RenderItem(text, x, y, size, font, 'ttf', (), font_paths))
+    plan = RenderPlan(tuple(items))
+    _PLAN_CACHE[rows] = plan
+    while len(_PLAN_CACHE) > PLAN_CACHE_SIZE:
+        _PLAN_CACHE.popitem(last=False)
+    return plan
+
+def render_layer(item, rng):
+    """
+    Render the transparent text layer of one plan item.
+    """
+    if item.kind == 'hand' and item.glyphs:
+        # 同一 (文字, 高度) 从预合成的变体池中抽取，glyphs 一并作为键，字库变化后自动失效
+        return handwrite_pool.get((item.text, item.size, item.glyphs),
+                                  lambda r: compose_handwrite(item.glyphs, item.size, rng=r), rng)
+    if item.kind == 'mixed':
+        return handwrite_pool.get((item.text, item.size, item.glyphs),
+                                  lambda r: compose_segments(item.glyphs, item.size, rng=r), rng)
+    if item.kind == 'hand':
+        print(f"[Warning] 无法找到 {item.text} 的手写体, 用字体代替.")
+    font_path = item.font_paths[0] if len(item.font_paths) == 1 else rng.choice(item.font_paths)
+    return text_layer_cache.get_or_create((item.text, font_path, item.size),
+                                          lambda: text_to_png(item.text, item.size, font_path))
+
+def render_plan(imgp, plan, rng=None, augment=False):
+    """
+    Replay a compiled plan onto a template.
+
+    Args:
+        imgp (str | PIL.Image.Image): Template path, or an already decoded template.
+        plan (RenderPlan): Plan produced by compile_plan.
+        rng (random.Random, optional): Random source for this render.
+        augment (bool): Apply ink spread/break augmentation to every layer.
+
+    Returns:
+        PIL.Image.Image: The rendered RGBA page.
+    """
+    rng = random if rng is None else rng
+    with profiler.stage("decode"):
+        if isinstance(imgp, str):
+            image = shared_image(imgp)
+            if image is None:
+                image = Image.open(imgp)
+        else:
+            image = imgp
+        canvas = image.convert("RGBA")
+        if canvas is image:
+            canvas = image.copy()
+    for item in plan.items:
+        layer = render_layer(item, rng)
+        if augment:
+            with profiler.stage("augment"):
+                layer = Augmentation(layer, rng=rng).run()
+        with profiler.stage("composite"):
+            paste_layer(canvas, layer, (item.x, item.y))
+    return canvas
+
+def jitter_plan(plan, disturbance, rng=None):
+    """
+    Return a copy of a plan with every row's X/Y/size disturbed, as ConfigGenerator does.
+
+    Args:
+        plan (RenderPlan): Plan produced by compile_plan.
+        disturbance (int | str): Amplitudes, e.g. 10 or "20 10 5" for X, Y and size.
+        rng (random.Random, optional): Random source.
+    """
+    rng = random if rng is None else rng
+    x_dis, y_dis, f_dis = sparse_disturb(disturbance)
+    if not (x_dis or y_dis or f_dis):
+        return plan
+    items = []
+    for item in plan.items:
+        # 扰动后不越过模版左上边界
+        items.append(item._replace(x=max(0, int(item.x + rng.uniform(-x_dis, x_dis))),
+                                   y=max(0, int(item.y + rng.uniform(-y_dis, y_dis))),
+                                   size=max(1, int(item.size + rng.uniform(-f_dis, f_dis)))))
+    return RenderPlan(tuple(items))
+
+def draw_variants(imgp, conf, n, seeds=None, disturbance=0, augment=False, output_paths=None, fmt=None):
+    """
+    Render n differently randomized copies of one config in a single pass.
+
+    The config is compiled and the template decoded once; each copy only varies glyph variant
+    choice, position jitter and (optionally) augmentation.
+
+    Args:
+        imgp (str): Path of the template image.
+        conf (pd.DataFrame | RenderPlan): Config rows or a compiled plan.
+        n (int): Number of copies.
+        seeds (list of int, optional): One seed per copy for reproducible copies.
+        disturbance (int | str): Position/size jitter per copy, same format as ConfigGenerator's 扰动.
+        augment (bool): Apply ink augmentation to each layer.
+        output_paths (list of str, optional): Save copy i to output_paths[i] instead of returning it.
+        fmt (str | OutputFormat, optional): Output format of saved copies, see utils.io.OUTPUT_FORMATS.
+
+    Yields:
+        PIL.Image.Image or str: Each rendered copy, or its output path, as soon as it is ready; None
+                                for a copy whose jitter pushed a row past the template, which is
+                                reported and skipped without aborting the other copies.
+    """
+    if seeds is not None and len(seeds) != n:
+        raise ValueError("seeds must contain one seed per copy.")
+    if output_paths is not None and len(output_paths) != n:
+        raise ValueError("output_paths must contain one path per copy.")
+    plan = compile_plan(conf)
+    with profiler.stage("decode"):
+        template = Image.open(imgp).convert("RGBA")
+    for i in range(n):
+        rng = random if seeds is None else random.Random(seeds[i])
+        try:
+            image = render_plan(template, jitter_plan(plan, disturbance, rng), rng=rng, augment=augment)
+        except ValueError as e:
+            print(f"[Warning] 第 {i + 1} 份扰动后超出模版范围，已跳过: {e}")
+            yield None
+            continue
+        if output_paths is not None:
+            save_image(image, output_paths[i], fmt)
+            yield output_paths[i]
+        else:
+            yield image
+
+def draw(imgp, conf, output_path="./output_img.png", seed=None, cache=None, writer=None, fmt=None, tile_height=None,
+         callback=None):
+    """
+    Render a config onto a template.
+
+    Args:
+        imgp (str): Path of the template image.
+        conf (pd.DataFrame | RenderPlan): Config rows with 文字/X/Y/大小/字体 columns, or a compiled plan.
+        output_path (str): Where to save the result, if None the image is returned.
+        seed (int, optional): Per-document seed. With a seed the render is reproducible.
+        cache (RenderCache, optional): Content-addressed cache, only used together with a seed.
+        writer (AsyncWriter, optional): Hand the page to a background writer instead of saving it here.
+        fmt (str | OutputFormat, optional): Output format, see utils.io.OUTPUT_FORMATS, defaults to PNG.
+        tile_height (int, optional): Render in strips of this height and stream them into the PNG
+                                     (see render_tiled), only used with an output_path.
+        callback (callable, optional): callback(error) once output_path is completely written; with a
+                                       writer it runs on the writer thread and also reports failures.
+    """
+    with profiler.document(output_path or 'draw'):
+        plan = compile_plan(conf)
+        key = None
+        if cache is not None and seed is not None:
+            key = cache.key(imgp, plan, seed)
+            cached = cache.get(key)
+            if cached:
+                if not output_path:
+                    return Image.open(cached)
+                target = output_format(writer.fmt if fmt is None and writer is not None else fmt, output_path)
+                if writer is not None and not (target.format == 'PNG' and target.mode is None):
+                    writer.save(Image.open(cached), output_path, fmt, callback=callback)
+                    return True
+                if target.format == 'PNG' and target.mode is None:
+                    with atomic_output(output_path) as tmp:
+                        shutil.copyfile(cached, tmp)
+                else:
+                    save_image(Image.open(cached), output_path, fmt)
+                if callback is not None:
+                    callback(None)
+                return True
+        rng = random if seed is None else random.Random(seed)
+        if output_path and tile_height:
+            # 分条带渲染并直接写盘，不经过后台写入线程
+            fmt = writer.fmt if fmt is None and writer is not None else fmt
+            render_tiled(imgp, plan, output_path, rng=rng, tile_height=tile_height, fmt=fmt)
+            if key is not None and output_format(fmt, output_path).mode is None:
+                cache.put_file(key, output_path)
+            if callback is not None:
+                callback(None)
+            return True
+        image = render_plan(imgp, plan, rng=rng)
+        if key is not None and not output_path:
+            cache.put(key, image)
+        elif key is not None:
+            # 缓存跟随页面写出：无损 RGBA PNG 直接复制写好的文件，其他格式另存一份 PNG；
+            # 有后台写入线程时在写入线程上完成，不占用渲染线程
+            target = output_format(writer.fmt if fmt is None and writer is not None else fmt, output_path)
+            lossless = target.format == 'PNG' and target.mode is None
+            done = callback
+
+            def callback(error):
+                if error is None:
+                    try:
+                        if lossless:
+                            cache.put_file(key, output_path)
+                        else:
+                            cache.put(key, image)
+                    except OSError as e:
+                        print(f"[Cache] 写入缓存失败: {e}")
+                if done is not None:
+                    done(error)
+        if output_path:
+            if writer is not None:
+                # 编码在写入线程上计时，计入批次的 save 阶段
+                writer.save(image, output_path, fmt, callback=callback)
+                return True
+            with profiler.stage("save"):
+                save_image(image, output_path, fmt)
+            if callback is not None:
+                callback(None)
+            return True
+        else:
+            return image
     
     
 if __name__ == "__main__":